@@ -0,0 +1,249 @@
+'''
+Online backups of the database and a manifest of LAND_RENT_IMAGES_DIR.
+
+SQLite is copied with the sqlite backup API, BACKUP_PAGES_PER_STEP pages at a time with a
+BACKUP_STEP_SLEEP pause between steps, so writers are only held up for one short step.
+The copy is consistent: sqlite starts it over when another connection writes mid-way, and
+after BACKUP_MAX_RESTARTS restarts the backup gives up instead of copying forever under a
+steady write load; run it again at a quieter time or with a larger BACKUP_PAGES_PER_STEP.
+Postgres is streamed from pg_dump, which reads one MVCC snapshot and does not block writers.
+
+Every backup is a directory in BACKUP_DIR holding the database copy, a gzip NDJSON manifest
+of the image files (name, size, mtime and optionally sha256) and backup.json.
+
+Run from the repository root:
+    python -m projects.backup create [--hash-images]
+    python -m projects.backup verify BACKUP_DIR/land_lend-20250101-120000
+    python -m projects.backup restore BACKUP_DIR/land_lend-20250101-120000   # app stopped
+'''
+
+from sqlalchemy.engine import make_url
+from .database import sqlite_url
+from .utils.logic import LAND_RENT_IMAGES_DIR
+
+from datetime import datetime
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(os.environ['HOME'], 'land_lend_backups'))
+BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', 256))
+BACKUP_STEP_SLEEP = float(os.getenv('BACKUP_STEP_SLEEP', 0.05))
+BACKUP_MAX_RESTARTS = int(os.getenv('BACKUP_MAX_RESTARTS', 5))
+
+SQLITE_FILE = 'database.sqlite3'
+POSTGRES_FILE = 'database.sql.gz'
+MANIFEST_FILE = 'images.manifest.ndjson.gz'
+METADATA_FILE = 'backup.json'
+
+
+def file_sha256(path: str) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as fp:
+		for chunk in iter(lambda: fp.read(1 << 20), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+################
+## database
+################
+
+def backup_sqlite(database: str, target: str, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP, max_restarts=BACKUP_MAX_RESTARTS):
+	copied = 0
+	restarts = 0
+
+	def progress(status, remaining, total):
+		nonlocal copied, restarts
+		if total - remaining <= copied: # a write from another connection started the copy over.
+			restarts += 1
+			if restarts > max_restarts:
+				raise RuntimeError(f'Database changed during the backup {restarts} times, giving up.')
+		copied = total - remaining
+		print(f'\rCopied {copied}/{total} pages', end='', flush=True)
+		if remaining:
+			# the backup() sleep argument only applies when the database is busy.
+			time.sleep(sleep)
+
+	source = sqlite3.connect(f'file:{database}?mode=ro', uri=True)
+	destination = sqlite3.connect(target)
+	try:
+		with destination:
+			source.backup(destination, pages=pages, progress=progress)
+	finally:
+		destination.close()
+		source.close()
+	print()
+
+def backup_postgres(url: str, target: str):
+	with gzip.open(target, 'wb') as out:
+		dump = subprocess.Popen(['pg_dump', '--no-owner', '--clean', '--if-exists', '--dbname', url], stdout=subprocess.PIPE)
+		for chunk in iter(lambda: dump.stdout.read(1 << 20), b''):
+			out.write(chunk)
+		if dump.wait() != 0:
+			raise RuntimeError(f'pg_dump exited with {dump.returncode}')
+
+def sqlite_schema_versions(database: str) -> list[int]:
+	connection = sqlite3.connect(f'file:{database}?mode=ro', uri=True)
+	try:
+		return [row[0] for row in connection.execute('SELECT version FROM schema_version ORDER BY version')]
+	except sqlite3.OperationalError: # not migrated yet.
+		return []
+	finally:
+		connection.close()
+
+
+################
+## images
+################
+
+def write_manifest(target: str, hash_images=False) -> int:
+	'''Stream the image dir listing into the manifest, return the number of files.'''
+	count = 0
+	with gzip.open(target, 'wt', encoding='utf-8') as fp:
+		if not os.path.isdir(LAND_RENT_IMAGES_DIR):
+			return 0
+
+		with os.scandir(LAND_RENT_IMAGES_DIR) as entries:
+			for entry in entries:
+				if not entry.is_file(follow_symlinks=False):
+					continue
+
+				stat = entry.stat(follow_symlinks=False)
+				record = {'name': entry.name, 'size': stat.st_size, 'mtime': stat.st_mtime}
+				if hash_images:
+					record['sha256'] = file_sha256(entry.path)
+				fp.write(json.dumps(record) + '\n')
+				count += 1
+	return count
+
+def check_manifest(path: str) -> dict:
+	'''Compare the manifest with the current image dir.'''
+	result = {'files': 0, 'missing': 0, 'changed': 0}
+	with gzip.open(path, 'rt', encoding='utf-8') as fp:
+		for line in fp:
+			record = json.loads(line)
+			result['files'] += 1
+
+			file_path = os.path.join(LAND_RENT_IMAGES_DIR, record['name'])
+			if not os.path.exists(file_path):
+				result['missing'] += 1
+			elif os.path.getsize(file_path) != record['size'] or ('sha256' in record and file_sha256(file_path) != record['sha256']):
+				result['changed'] += 1
+	return result
+
+
+################
+## commands
+################
+
+def create(hash_images=False, backup_dir=BACKUP_DIR) -> str:
+	url = make_url(sqlite_url)
+	path = os.path.join(backup_dir, datetime.now().strftime('land_lend-%Y%m%d-%H%M%S'))
+	os.makedirs(path)
+
+	started = time.time()
+	metadata = {'created_at': datetime.now().isoformat(), 'dialect': url.get_backend_name()}
+
+	if metadata['dialect'] == 'sqlite':
+		database_file = os.path.join(path, SQLITE_FILE)
+		backup_sqlite(url.database, database_file)
+		metadata['schema_versions'] = sqlite_schema_versions(database_file)
+	elif metadata['dialect'] == 'postgresql':
+		database_file = os.path.join(path, POSTGRES_FILE)
+		backup_postgres(url.render_as_string(hide_password=False), database_file)
+	else:
+		raise RuntimeError(f'No backup support for {metadata["dialect"]}.')
+
+	metadata['database_file'] = os.path.basename(database_file)
+	metadata['database_sha256'] = file_sha256(database_file)
+	metadata['images'] = write_manifest(os.path.join(path, MANIFEST_FILE), hash_images=hash_images)
+	metadata['seconds'] = round(time.time() - started, 3)
+
+	with open(os.path.join(path, METADATA_FILE), 'w') as fp:
+		json.dump(metadata, fp, indent=2)
+
+	return path
+
+def verify(path: str) -> bool:
+	with open(os.path.join(path, METADATA_FILE)) as fp:
+		metadata = json.load(fp)
+
+	database_file = os.path.join(path, metadata['database_file'])
+	ok = file_sha256(database_file) == metadata['database_sha256']
+	print(f'database checksum: {"ok" if ok else "MISMATCH"}')
+
+	if metadata['dialect'] == 'sqlite':
+		connection = sqlite3.connect(f'file:{database_file}?mode=ro', uri=True)
+		try:
+			integrity = connection.execute('PRAGMA integrity_check').fetchone()[0]
+		finally:
+			connection.close()
+		print(f'database integrity: {integrity}')
+		ok = ok and integrity == 'ok'
+	else:
+		with gzip.open(database_file, 'rb') as fp: # reading it through checks the gzip crc.
+			for _ in iter(lambda: fp.read(1 << 20), b''):
+				pass
+
+	images = check_manifest(os.path.join(path, MANIFEST_FILE))
+	print(f'images: {images["files"]} in manifest, {images["missing"]} missing, {images["changed"]} changed on disk')
+
+	return ok
+
+def restore(path: str):
+	'''Replace the configured database with the backup. Stop the app first.'''
+	if not verify(path):
+		raise RuntimeError('Backup failed verification, not restoring it.')
+
+	with open(os.path.join(path, METADATA_FILE)) as fp:
+		metadata = json.load(fp)
+
+	url = make_url(sqlite_url)
+	if url.get_backend_name() != metadata['dialect']:
+		raise RuntimeError(f'Backup is {metadata["dialect"]}, the configured database is {url.get_backend_name()}.')
+
+	database_file = os.path.join(path, metadata['database_file'])
+	if metadata['dialect'] == 'sqlite':
+		tmp_path = url.database + '.restore'
+		shutil.copyfile(database_file, tmp_path)
+		for leftover in (url.database + '-wal', url.database + '-shm'): # belong to the old file.
+			if os.path.exists(leftover):
+				os.remove(leftover)
+		os.replace(tmp_path, url.database)
+	else:
+		with gzip.open(database_file, 'rb') as fp:
+			psql = subprocess.Popen(['psql', '--quiet', '--dbname', url.render_as_string(hide_password=False)], stdin=subprocess.PIPE)
+			shutil.copyfileobj(fp, psql.stdin)
+			psql.stdin.close()
+			if psql.wait() != 0:
+				raise RuntimeError(f'psql exited with {psql.returncode}')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Online database backups.')
+	commands = parser.add_subparsers(dest='command', required=True)
+	create_parser = commands.add_parser('create', help='take a backup while the app runs.')
+	create_parser.add_argument('--hash-images', action='store_true', help='record sha256 of every image (slow).')
+	create_parser.add_argument('--dir', default=BACKUP_DIR)
+	commands.add_parser('verify', help='check a backup.').add_argument('path')
+	commands.add_parser('restore', help='restore a backup, stop the app first.').add_argument('path')
+	args = parser.parse_args()
+
+	if args.command == 'create':
+		print(f'Backup written to {create(hash_images=args.hash_images, backup_dir=args.dir)}')
+	elif args.command == 'verify':
+		print('Backup OK.' if verify(args.path) else 'Backup BROKEN.')
+	else:
+		restore(args.path)
+		print('Restored.')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,41 @@
+# Run from the repository root: python -m projects.benchmarks.bench_startup
+
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+
+def time_import(runs=10):
+	'''Cold import of the app in a fresh interpreter, the cost every worker pays on boot.'''
+	timings = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		subprocess.run([sys.executable, '-c', 'import projects.main'], check=True)
+		timings.append(time.perf_counter() - start)
+	return timings
+
+def time_lifespan(runs=10):
+	'''Lifespan startup and shutdown: engine creation, job workers, no DDL.'''
+	from ..main import app
+
+	async def cycle():
+		async with app.router.lifespan_context(app):
+			pass
+
+	timings = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		asyncio.run(cycle())
+		timings.append(time.perf_counter() - start)
+	return timings
+
+
+def main():
+	for label, timings in (('import', time_import()), ('lifespan', time_lifespan())):
+		print(f'{label:9}: median {statistics.median(timings) * 1000:8.2f} ms, max {max(timings) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,62 @@
+# Run from the repository root: python -m projects.benchmarks.bench_workers --max-workers 4
+
+from concurrent.futures import ThreadPoolExecutor
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def wait_ready(url, timeout=20):
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		try:
+			urllib.request.urlopen(url, timeout=1).read()
+			return
+		except OSError:
+			time.sleep(0.2)
+	raise RuntimeError(f'server at {url} did not start')
+
+def load(url, requests, concurrency) -> float:
+	'''Requests per second for `requests` GETs from `concurrency` client threads.'''
+	def fetch(_):
+		urllib.request.urlopen(url, timeout=10).read()
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(concurrency) as pool:
+		list(pool.map(fetch, range(requests)))
+	return requests / (time.perf_counter() - start)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+	parser.add_argument('--requests', type=int, default=5000)
+	parser.add_argument('--concurrency', type=int, default=64)
+	parser.add_argument('--port', type=int, default=8765)
+	args = parser.parse_args()
+
+	url = f'http://127.0.0.1:{args.port}/'
+	baseline = None
+	for workers in range(1, args.max_workers + 1):
+		server = subprocess.Popen(
+			[sys.executable, '-m', 'projects.serve', '--workers', str(workers), '--port', str(args.port), '--log-level', 'warning'],
+		)
+		try:
+			wait_ready(url)
+			load(url, 200, args.concurrency) # warm up.
+			rps = load(url, args.requests, args.concurrency)
+		finally:
+			server.send_signal(signal.SIGTERM)
+			server.wait()
+
+		baseline = baseline or rps
+		print(f'{workers:3} workers: {rps:10.1f} req/s ({rps / baseline:5.2f}x)')
+
+
+if __name__ == '__main__':
+	main()
@@ -1,29 +1,67 @@
 # Bismillah
 
+from contextlib import asynccontextmanager
+import os
+
 from fastapi import FastAPI
 
 from .schemas.models import User, Land, Chat
-from .database import init_db
-from .routes import auth, users, lands, chats
+from .database import get_engine, dispose_engine, init_db, ReadYourWritesMiddleware
+from .routes import auth, users, lands, chats, jobs, stats
+from .utils.jobs import job_queue
+from .utils.reconcile import schedule_reconcile
+from .utils.stats import schedule_recompute
+from .utils.rentals import schedule_rental_sync
+from .utils.chat_archive import schedule_archive
+from .utils.compression import CompressionMiddleware
+from .utils.idempotency import IdempotencyMiddleware, schedule_prune
+from .utils.revocation import schedule_token_prune
+
+# migrations normally run once per deploy with: python -m projects.migrate
+RUN_MIGRATIONS_ON_STARTUP = os.getenv('RUN_MIGRATIONS_ON_STARTUP', '0').lower() in ('1', 'true', 'yes')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	get_engine()
+	if RUN_MIGRATIONS_ON_STARTUP:
+		init_db()
+
+	job_queue.start()
+	schedule_reconcile()
+	schedule_recompute()
+	schedule_rental_sync()
+	schedule_archive()
+	schedule_prune()
+	schedule_token_prune()
+
+	yield
+
+	job_queue.stop()
+	dispose_engine()
 
 
 app = FastAPI(
 	prefix='/api/v1',
 	description='Land Rent Management System.',
+	lifespan=lifespan,
 	#openapi_url=None
 )
 
-@app.on_event('startup')
-async def startup():
-	init_db()
 
+# the last added middleware runs first: idempotency stores uncompressed responses.
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(lands.router)
 app.include_router(chats.router)
+app.include_router(jobs.router)
+app.include_router(stats.router)
 
 
 @app.get('/')
 async def index():
-	return {'msg': 'Land Rent Management System'}
\ No newline at end of file
+	return {'msg': 'Land Rent Management System'}
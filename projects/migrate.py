@@ -0,0 +1,88 @@
+'''
+Versioned schema migrations.
+
+Each module in projects/migrations named vNNNN_<description>.py has an upgrade(connection)
+function. Applied versions are recorded in the schema_version table, so every migration
+runs once. A migration spells out its own tables (or raw SQL) as they were at that version
+and never imports app code: the models change, an applied migration must not. Run it once per deploy, before starting the workers (from the repository root):
+    python -m projects.migrate
+    python -m projects.migrate --list
+'''
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, select, text
+from . import migrations
+
+import argparse
+import importlib
+import pkgutil
+import time
+
+version_table = Table(
+	'schema_version', MetaData(),
+	Column('version', Integer, primary_key=True),
+	Column('name', String, nullable=False),
+	Column('applied_at', Float, nullable=False),
+)
+
+
+def create_tables(connection, *tables: Table):
+	'''Create the given tables and their indexes if they don't exist yet.'''
+	for table in tables:
+		table.create(connection, checkfirst=True)
+
+def load_migrations():
+	found = []
+	for module in pkgutil.iter_modules(migrations.__path__):
+		if module.name.startswith('v') and module.name[1:5].isdigit():
+			found.append((int(module.name[1:5]), module.name))
+
+	return [(version, name, importlib.import_module(f'{migrations.__name__}.{name}')) for version, name in sorted(found)]
+
+def applied_versions(connection) -> set[int]:
+	return set(connection.execute(select(version_table.c.version)).scalars())
+
+def migrate(engine, target: int | None = None) -> list[str]:
+	'''Apply pending migrations up to target (all by default) in one transaction.'''
+	applied = []
+	with engine.begin() as connection:
+		if connection.dialect.name == 'postgresql':
+			# serialize concurrent runs, e.g. two deploys starting at once.
+			connection.execute(text('SELECT pg_advisory_xact_lock(4242)'))
+
+		version_table.create(connection, checkfirst=True)
+		done = applied_versions(connection)
+
+		for version, name, module in load_migrations():
+			if version in done or (target is not None and version > target):
+				continue
+
+			module.upgrade(connection)
+			connection.execute(version_table.insert().values(version=version, name=name, applied_at=time.time()))
+			applied.append(name)
+
+	return applied
+
+
+def main():
+	from .database import get_engine
+
+	parser = argparse.ArgumentParser(description='Apply database migrations.')
+	parser.add_argument('--target', type=int, default=None, help='stop after this version.')
+	parser.add_argument('--list', action='store_true', help='list migrations and whether they are applied.')
+	args = parser.parse_args()
+
+	engine = get_engine()
+	if args.list:
+		with engine.begin() as connection:
+			version_table.create(connection, checkfirst=True)
+			done = applied_versions(connection)
+		for version, name, _ in load_migrations():
+			print(f'[{"x" if version in done else " "}] {name}')
+		return
+
+	applied = migrate(engine, target=args.target)
+	print(f'Applied: {", ".join(applied)}' if applied else 'Database is up to date.')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,56 @@
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, String, Float, Boolean, DateTime, Enum
+from ..migrate import create_tables
+
+metadata = MetaData()
+
+user = Table(
+	'user', metadata,
+	Column('username', String, nullable=False, index=True),
+	Column('full_name', String, nullable=False, index=True),
+	Column('email', String, nullable=False, index=True),
+	Column('address', String, nullable=False),
+	Column('phone_number', String, nullable=False),
+	Column('id', Integer, primary_key=True),
+	Column('hashed_password', String, nullable=False),
+	Column('role', Enum('admin', 'normal_user', 'security', 'staff', name='roleenum')),
+	Column('disabled', Boolean, nullable=False),
+)
+
+land = Table(
+	'land', metadata,
+	Column('name', String, nullable=False, index=True),
+	Column('address', String, nullable=False, index=True),
+	Column('size', Float),
+	Column('location', String, nullable=False),
+	Column('description', String, index=True),
+	Column('id', Integer, primary_key=True),
+	Column('borrowed', Boolean, nullable=False),
+)
+
+userlandlink = Table(
+	'userlandlink', metadata,
+	Column('user_id', Integer, ForeignKey('user.id'), primary_key=True),
+	Column('land_id', Integer, ForeignKey('land.id'), primary_key=True),
+)
+
+image = Table(
+	'image', metadata,
+	Column('label', String, nullable=False, index=True),
+	Column('id', Integer, primary_key=True),
+	Column('url', String, nullable=False),
+	Column('land_id', Integer, ForeignKey('land.id'), nullable=False),
+)
+
+chat = Table(
+	'chat', metadata,
+	Column('msg', String, nullable=False),
+	Column('reciever_id', Integer),
+	Column('intended_user', Enum('ONE', 'ALL', name='intendeduserenum'), nullable=False),
+	Column('sender_id', Integer, ForeignKey('user.id')),
+	Column('id', Integer, primary_key=True),
+	Column('sent_at', DateTime, nullable=False),
+)
+
+
+def upgrade(connection):
+	create_tables(connection, user, land, userlandlink, image, chat)
@@ -0,0 +1,29 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, Enum
+from ..migrate import create_tables
+
+metadata = MetaData()
+
+revokedtoken = Table(
+	'revokedtoken', metadata,
+	Column('jti', String, primary_key=True),
+	Column('expires_at', Integer, nullable=False, index=True),
+	Column('revoked_at', Float, nullable=False, index=True),
+)
+
+job = Table(
+	'job', metadata,
+	Column('id', Integer, primary_key=True),
+	Column('name', String, nullable=False, index=True),
+	Column('payload', String, nullable=False),
+	Column('status', Enum('pending', 'running', 'done', 'failed', name='jobstatusenum'), nullable=False, index=True),
+	Column('attempts', Integer, nullable=False),
+	Column('max_attempts', Integer, nullable=False),
+	Column('last_error', String),
+	Column('run_after', Float, nullable=False, index=True),
+	Column('created_at', DateTime, nullable=False),
+	Column('updated_at', DateTime, nullable=False),
+)
+
+
+def upgrade(connection):
+	create_tables(connection, revokedtoken, job)
@@ -0,0 +1,41 @@
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Index, Integer, Date, DateTime, select, insert
+from ..migrate import create_tables
+
+from datetime import date, datetime
+
+OPEN_END = date(9999, 12, 31)
+
+metadata = MetaData()
+
+# only the columns this migration reads or references.
+Table('user', metadata, Column('id', Integer, primary_key=True))
+Table('land', metadata, Column('id', Integer, primary_key=True))
+userlandlink = Table(
+	'userlandlink', metadata,
+	Column('user_id', Integer, primary_key=True),
+	Column('land_id', Integer, primary_key=True),
+)
+
+rental = Table(
+	'rental', metadata,
+	Column('start_date', Date, nullable=False),
+	Column('end_date', Date, nullable=False),
+	Column('id', Integer, primary_key=True),
+	Column('land_id', Integer, ForeignKey('land.id'), nullable=False),
+	Column('user_id', Integer, ForeignKey('user.id'), nullable=False, index=True),
+	Column('created_at', DateTime, nullable=False),
+	Column('cancelled_at', DateTime),
+	Index('ix_rental_land_period', 'land_id', 'start_date', 'end_date'),
+)
+
+
+def upgrade(connection):
+	create_tables(connection, rental)
+
+	# current renters become open ended rentals starting today, their real start is unknown.
+	rows = connection.execute(select(userlandlink.c.user_id, userlandlink.c.land_id)).all()
+	if rows:
+		connection.execute(insert(rental), [
+			{'user_id': user_id, 'land_id': land_id, 'start_date': date.today(), 'end_date': OPEN_END, 'created_at': datetime.now()}
+			for user_id, land_id in rows
+		])
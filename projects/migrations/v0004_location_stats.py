@@ -0,0 +1,66 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Date, DateTime, select, insert, func, case, exists, and_
+from ..migrate import create_tables
+
+from datetime import date, timedelta
+
+metadata = MetaData()
+
+land = Table(
+	'land', metadata,
+	Column('id', Integer, primary_key=True),
+	Column('size', Float),
+	Column('location', String, nullable=False),
+)
+rental = Table(
+	'rental', metadata,
+	Column('id', Integer, primary_key=True),
+	Column('land_id', Integer, nullable=False),
+	Column('user_id', Integer, nullable=False),
+	Column('start_date', Date, nullable=False),
+	Column('end_date', Date, nullable=False),
+	Column('cancelled_at', DateTime),
+)
+
+locationstats = Table(
+	'locationstats', metadata,
+	Column('location', String, primary_key=True),
+	Column('lands', Integer, nullable=False),
+	Column('hectares', Float, nullable=False),
+	Column('rented', Integer, nullable=False),
+	Column('rented_hectares', Float, nullable=False),
+	Column('renters', Integer, nullable=False),
+)
+
+
+def live(start: date, end: date):
+	return and_(rental.c.cancelled_at.is_(None), rental.c.start_date < end, rental.c.end_date > start)
+
+def upgrade(connection):
+	create_tables(connection, locationstats)
+
+	today = date.today()
+	rented = exists().where(rental.c.land_id == land.c.id, live(today, today + timedelta(days=1)))
+	renters = (
+		select(rental.c.land_id, func.count(func.distinct(rental.c.user_id)).label('renters'))
+		.where(live(today, date.max))
+		.group_by(rental.c.land_id)
+		.subquery()
+	)
+	rows = connection.execute(
+		select(
+			land.c.location,
+			func.count(land.c.id),
+			func.coalesce(func.sum(land.c.size), 0),
+			func.coalesce(func.sum(case((rented, 1), else_=0)), 0),
+			func.coalesce(func.sum(case((rented, land.c.size), else_=0)), 0),
+			func.coalesce(func.sum(renters.c.renters), 0),
+		)
+		.outerjoin(renters, renters.c.land_id == land.c.id)
+		.group_by(land.c.location)
+	).all()
+
+	if rows:
+		connection.execute(insert(locationstats), [
+			dict(zip(('location', 'lands', 'hectares', 'rented', 'rented_hectares', 'renters'), row))
+			for row in rows
+		])
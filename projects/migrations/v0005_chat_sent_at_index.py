@@ -0,0 +1,6 @@
+from sqlalchemy import text
+
+
+def upgrade(connection):
+	# the chat retention job scans by sent_at.
+	connection.execute(text('CREATE INDEX IF NOT EXISTS ix_chat_sent_at ON chat (sent_at)'))
@@ -0,0 +1,15 @@
+from sqlalchemy import MetaData, Table, Column, Integer, Float
+from ..migrate import create_tables
+
+metadata = MetaData()
+
+landchange = Table(
+	'landchange', metadata,
+	Column('id', Integer, primary_key=True),
+	Column('land_id', Integer, nullable=False, index=True),
+	Column('changed_at', Float, nullable=False, index=True),
+)
+
+
+def upgrade(connection):
+	create_tables(connection, landchange)
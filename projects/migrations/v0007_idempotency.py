@@ -0,0 +1,19 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, LargeBinary
+from ..migrate import create_tables
+
+metadata = MetaData()
+
+idempotencyrecord = Table(
+	'idempotencyrecord', metadata,
+	Column('key', String, primary_key=True),
+	Column('fingerprint', String, nullable=False),
+	Column('status_code', Integer),
+	Column('content_type', String),
+	Column('body', LargeBinary),
+	Column('created_at', Float, nullable=False),
+	Column('expires_at', Float, nullable=False, index=True),
+)
+
+
+def upgrade(connection):
+	create_tables(connection, idempotencyrecord)
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+
+
+def upgrade(connection):
+	# postgres: no two live rentals of a land may overlap, whatever the application does.
+	# sqlite has no exclusion constraints, bookings take its write lock instead (utils/rentals.py).
+	if connection.dialect.name != 'postgresql':
+		return
+
+	connection.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+	connection.execute(text(
+		'ALTER TABLE rental ADD CONSTRAINT rental_no_overlap '
+		'EXCLUDE USING gist (land_id WITH =, daterange(start_date, end_date) WITH &&) '
+		'WHERE (cancelled_at IS NULL)'
+	))
@@ -0,0 +1,6 @@
+from sqlalchemy import text
+
+
+def upgrade(connection):
+	# running jobs hold a lease, only jobs whose lease ran out are taken back (utils/jobs.py).
+	connection.execute(text('ALTER TABLE job ADD COLUMN lease_until FLOAT'))
@@ -1,11 +1,13 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from ..utils.token import create_access_token
-from ..schemas.models import User, Token
-from ..utils.security import verify_password_hash
+from ..utils.token import create_access_token, create_refresh_token, decode_access_token, decode_refresh_token
+from ..utils.revocation import revocation_list
+from ..utils.ratelimit import login_ip_limiter, login_account_limiter, client_ip
+from ..schemas.models import User, Token, RefreshTokenIn
+from ..utils.security import verify_password_hash, oauth2_scheme
 from ..database import get_session
 
 
@@ -19,9 +21,16 @@ router = APIRouter(
     response_model=Token
 )
 async def login(
+	request: Request,
 	form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 	session: Annotated[Session, Depends(get_session)]
 ):
+    # throttle before any DB lookup or password hashing. Only failed attempts count against
+    # the account, so someone else's wrong passwords can lock it out for a window at most.
+    account = form_data.username.lower()
+    login_ip_limiter.check(client_ip(request))
+    login_account_limiter.check(account, cost=0)
+
     credential_exception = HTTPException(
         status_code=401,
         detail='Incorrect username or password',
@@ -33,12 +42,60 @@ async def login(
 	).first()
 
     if not db_user:
+        login_account_limiter.charge(account)
         raise credential_exception
 
     if not verify_password_hash(form_data.password, db_user.hashed_password):
+        login_account_limiter.charge(account)
         raise HTTPException(status_code=401, detail='Incorrect username or password')
 
-    data = {'sub': db_user.email}
-    token = create_access_token(data=data)
+    return _issue_tokens(db_user)
+
+@router.post(
+    '/refresh',
+    response_model=Token
+)
+async def refresh_token(
+	data: RefreshTokenIn,
+	session: Annotated[Session, Depends(get_session)]
+):
+    payload = decode_refresh_token(data.refresh_token)
+
+    db_user = session.exec(
+		select(User).where(User.email == payload.get('sub'))
+	).first()
+
+    if not db_user or db_user.disabled:
+        raise HTTPException(status_code=401, detail='Invalid token.')
 
-    return Token(access_token=token, token_type='bearer')
+    # rotate: a refresh token can only be used once. The claim is an insert into the
+    # revokedtoken table, so two workers can't both spend the same token.
+    if not revocation_list.claim(payload, session):
+        raise HTTPException(status_code=401, detail='Token revoked.')
+
+    return _issue_tokens(db_user)
+
+@router.post(
+    '/logout',
+    response_model=dict[str, str | bool]
+)
+async def logout(
+	token: Annotated[str, Depends(oauth2_scheme)],
+	session: Annotated[Session, Depends(get_session)],
+	data: RefreshTokenIn | None = None
+):
+    revocation_list.revoke(decode_access_token(token), session)
+
+    if data:
+        revocation_list.revoke(decode_refresh_token(data.refresh_token), session)
+
+    return {'msg': 'Logged out successfully.', 'ok': True}
+
+def _issue_tokens(user: User):
+    data = {'sub': user.email}
+
+    return Token(
+        access_token=create_access_token(data=data),
+        refresh_token=create_refresh_token(data=data),
+        token_type='bearer'
+    )
@@ -1,10 +1,13 @@
 from typing import Annotated
+from itertools import islice
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import select, Session, or_
 from ..schemas.models import User, Chat, ChatIn, ChatOut, ChatUpdate
 from ..schemas.enums import RoleEnum, IntendedUserEnum
-from ..database import get_session
+from ..database import get_session, get_read_session
+from ..utils.serializers import FAST_RESPONSES, FastJSONResponse, chat_row
+from ..utils.chat_archive import read_segment
 from ..utils.security import (
 			get_current_active_user,
 			authorize_user
@@ -58,7 +61,7 @@ async def register_chat(*,
 async def fetch_chats(*,
 	user: Annotated[User, Depends(get_current_active_user)],
 	skip: int = 0, limit: int = 100,
-	session: Annotated[Session, Depends(get_session)]
+	session: Annotated[Session, Depends(get_read_session)]
 ):
 	chats = session.exec(
 		select(Chat).where(or_(Chat.reciever_id == user.id, Chat.intended_user == IntendedUserEnum.ALL)).offset(skip).limit(limit)
@@ -67,6 +70,30 @@ async def fetch_chats(*,
 	if not chats:
 		raise HTTPException(status_code=404, detail='No Chats yet!.')
 
+	if FAST_RESPONSES:
+		return FastJSONResponse([chat_row(chat) for chat in chats])
+
+	return chats
+
+@router.get(
+	'/archive',
+	response_model=list[ChatOut]
+)
+def fetch_archived_chats(*, # plain def: decompressing a segment blocks, FastAPI runs it in the threadpool.
+	user: Annotated[User, Depends(get_current_active_user)],
+	month: Annotated[str, Query(pattern=r'^\d{4}-\d{2}$', description='YYYY-MM')],
+	skip: int = 0, limit: int = 100
+):
+	'''Chats moved out of the chat table by the retention job, one month at a time.'''
+	chats = (
+		chat for chat in read_segment(month)
+		if chat['reciever_id'] == user.id or chat['sender_id'] == user.id or chat['intended_user'] == IntendedUserEnum.ALL
+	)
+	chats = list(islice(chats, skip, skip + limit))
+
+	if not chats:
+		raise HTTPException(status_code=404, detail=f'No archived chats for {month}.')
+
 	return chats
 
 @router.patch(
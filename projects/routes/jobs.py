@@ -0,0 +1,46 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import select, Session
+from ..schemas.models import Job, JobOut
+from ..schemas.enums import RoleEnum, JobStatusEnum
+from ..database import get_session
+from ..utils.security import authorize_user
+
+
+router = APIRouter(
+    prefix='/jobs',
+    dependencies=[Depends(authorize_user([RoleEnum.admin]))]
+)
+
+
+@router.get(
+	'/',
+	response_model=list[JobOut]
+)
+async def fetch_jobs(*,
+	status: JobStatusEnum | None = None,
+	skip: int = 0, limit: int = 100,
+	session: Annotated[Session, Depends(get_session)]
+):
+	stmt = select(Job)
+	if status:
+		stmt = stmt.where(Job.status == status)
+
+	return session.exec(
+		stmt.order_by(Job.id.desc()).offset(skip).limit(limit)
+	).all()
+
+@router.get(
+	'/{job_id}',
+	response_model=JobOut
+)
+async def fetch_job(
+	job_id: int,
+	session: Annotated[Session, Depends(get_session)]
+):
+	job = session.get(Job, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail=f'Job with id={job_id} not found.')
+
+	return job
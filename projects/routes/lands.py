@@ -1,13 +1,20 @@
 # Bismillah
 
 from typing import Annotated
+from datetime import date
 
 from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile, Form
 from sqlmodel import select, Session, or_
-from ..schemas.models import User, UserOutWithLands, Land, LandIn, LandOut, LandOutWithUser, LandUpdate, Image, ImageOut 
+from sqlalchemy.orm import selectinload, load_only
+from ..schemas.models import User, UserOutWithLands, Land, LandIn, LandOut, LandOutWithUser, LandUpdate, Image, ImageOut, Rental, RentalIn, RentalOut, OPEN_END
 from ..schemas.enums import RoleEnum
-from ..database import get_session
-from ..utils.logic import save_images, delete_image
+from ..database import get_session, get_read_session
+from ..utils.logic import save_images
+from ..utils.jobs import job_queue
+from ..utils.stats import apply_delta, land_delta
+from ..utils.catalog import LAND_CATALOG, catalog, record_change
+from ..utils.rentals import book_land, end_rental, current_rental, available_lands, release_rentals, check_period
+from ..utils.serializers import FAST_RESPONSES, FastJSONResponse, land_row_with_users, land_row_fields
 from ..utils.security import (
 			get_password_hash,
 			get_current_active_user,
@@ -18,6 +25,34 @@ router = APIRouter(
     prefix='/lands'
 )
 
+LAND_COLUMNS = {'id', 'name', 'address', 'size', 'location', 'description'}
+LAND_RELATIONSHIPS = {'images', 'renters'}
+LAND_FIELDS = LAND_COLUMNS | LAND_RELATIONSHIPS
+
+
+def parse_land_fields(fields: str | None) -> set[str] | None:
+	if not fields:
+		return None
+
+	requested = {field.strip() for field in fields.split(',') if field.strip()}
+	unknown = requested - LAND_FIELDS
+	if unknown:
+		raise HTTPException(status_code=400, detail=f'Unknown fields: {", ".join(sorted(unknown))}. Allowed: {", ".join(sorted(LAND_FIELDS))}.')
+
+	return requested | {'id'}
+
+def land_load_options(fields: set[str] | None):
+	'''Load only the requested columns and relationships, everything when fields is None.'''
+	if fields is None:
+		return [selectinload(Land.images), selectinload(Land.renters)]
+
+	options = [load_only(*(getattr(Land, column) for column in fields & LAND_COLUMNS))]
+	if 'images' in fields:
+		options.append(selectinload(Land.images))
+	if 'renters' in fields:
+		options.append(selectinload(Land.renters))
+	return options
+
 @router.post(
 	'/',
 	status_code=201,
@@ -33,7 +68,11 @@ async def register_land(*,
 	if db_land:
 		raise HTTPException(status_code=404, detail='Land already registered, if not consider changing the name')
 
+	land.borrowed = False # rentals go through the ledger.
 	session.add(land)
+	session.flush()
+	apply_delta(session, land.location, lands=1, hectares=land.size or 0)
+	record_change(session, land.id)
 	session.commit()
 
 @router.get('/',
@@ -56,10 +95,18 @@ async def fetch_lands_by_filter(*,
 	size_lesser: int | None = None,
 	size_greater: int | None = None,
 	description: str | None = None,
-	session: Annotated[Session, Depends(get_session)],
+	fields: Annotated[str | None, Query(description='Comma separated fields to return, e.g. id,name,location.')] = None,
+	session: Annotated[Session, Depends(get_read_session)],
 ):
+	projection = parse_land_fields(fields)
+
+	if LAND_CATALOG and projection is None:
+		rows = catalog.query(skip, limit, address, location, size_lesser, size_greater, description)
+		if not rows:
+			raise HTTPException(status_code=404, detail='Land not Found!. Refresh the filter and reload')
+		return FastJSONResponse(rows)
 
-	stmt = select(Land)
+	stmt = select(Land).options(*land_load_options(projection))
 
 	if address:
 		stmt = stmt.where(Land.address == address)
@@ -68,9 +115,9 @@ async def fetch_lands_by_filter(*,
 	if location:
 		stmt = stmt.where(Land.location == location)
 	if size_lesser:
-		stmt = stmt.where(Land.size_lesser < size_lesser)
+		stmt = stmt.where(Land.size < size_lesser)
 	if size_greater:
-		stmt = stmt.where(size_greater > size_greater)
+		stmt = stmt.where(Land.size > size_greater)
 	
 	lands = session.exec(
 		stmt.offset(skip).limit(limit)
@@ -79,6 +126,58 @@ async def fetch_lands_by_filter(*,
 	if not lands:
 		raise HTTPException(status_code=404, detail='Land not Found!. Refresh the filter and reload')
 
+	if projection is not None:
+		return FastJSONResponse([land_row_fields(land, projection) for land in lands])
+
+	if FAST_RESPONSES:
+		return FastJSONResponse([land_row_with_users(land) for land in lands])
+
+	return lands
+
+
+@router.get('/available',
+	dependencies=[
+		Depends(
+			authorize_user(
+				[RoleEnum.normal_user,
+				RoleEnum.security,
+				RoleEnum.staff]
+			)
+		)
+	],
+	response_model=list[LandOutWithUser]
+)
+async def fetch_available_lands(*,
+	start_date: date,
+	end_date: date,
+	location: str | None = None,
+	skip: int = 0,
+	limit: int = 100,
+	session: Annotated[Session, Depends(get_read_session)],
+):
+	# as for bookings, no past windows: the catalog only keeps rentals that have not ended.
+	check_period(start_date, end_date)
+
+	if LAND_CATALOG:
+		rows = catalog.query(skip, limit, location=location, start_date=start_date, end_date=end_date)
+		if not rows:
+			raise HTTPException(status_code=404, detail='No land available in that period.')
+		return FastJSONResponse(rows)
+
+	stmt = available_lands(start_date, end_date).options(*land_load_options(None))
+	if location:
+		stmt = stmt.where(Land.location == location)
+
+	lands = session.exec(
+		stmt.order_by(Land.id).offset(skip).limit(limit)
+	).all()
+
+	if not lands:
+		raise HTTPException(status_code=404, detail='No land available in that period.')
+
+	if FAST_RESPONSES:
+		return FastJSONResponse([land_row_with_users(land) for land in lands])
+
 	return lands
 
 
@@ -96,15 +195,27 @@ async def fetch_lands_by_filter(*,
 )
 async def fetch_land_by_id(*,
 	land_id: int,
-	session: Annotated[Session, Depends(get_session)],
+	fields: Annotated[str | None, Query(description='Comma separated fields to return, e.g. id,name,location.')] = None,
+	session: Annotated[Session, Depends(get_read_session)],
 ):	
+	projection = parse_land_fields(fields)
+
+	if LAND_CATALOG and projection is None:
+		row = catalog.get(land_id)
+		if not row:
+			raise HTTPException(status_code=404, detail=f'Land with id={land_id} not found.')
+		return FastJSONResponse(row)
+
 	land = session.exec(
-		select(Land).where(Land.id == land_id)
+		select(Land).options(*land_load_options(projection)).where(Land.id == land_id)
 	).first()
 
 	if not land:
 		raise HTTPException(status_code=404, detail=f'Land with id={land_id} not found.')
 
+	if projection is not None:
+		return FastJSONResponse(land_row_fields(land, projection))
+
 	return land
 
 @router.patch(
@@ -120,9 +231,12 @@ async def update_land_info(land_id:int, update_data: LandUpdate, session: Annota
 	
 	update_data = Land.model_dump(update_data, exclude_unset=True)
 
+	apply_delta(session, land.location, **land_delta(land, -1))
 	land.sqlmodel_update(update_data)
+	apply_delta(session, land.location, **land_delta(land, 1))
 
 	session.add(land)
+	record_change(session, land.id)
 	session.commit()
 	
 	session.refresh(land)
@@ -143,7 +257,16 @@ async def delete_land_info(
 	if not land:
 		raise HTTPException(status_code=404, detail='Land not found.')
 
+	release_rentals(session, Rental.land_id == land.id, detail=f'Land with id={land_id} has rentals that have not ended, end or cancel them first.')
+
+	labels = [image.label for image in land.images]
+
+	apply_delta(session, land.location, **land_delta(land, -1))
+	record_change(session, land.id)
 	session.delete(land)
+	if labels:
+		# image rows go with the land (cascade), their files are removed in the background.
+		job_queue.enqueue(session, 'delete_image_files', commit=False, labels=labels)
 	session.commit()
 
 	return {'msg': 'Land info successfully deleted!.', 'ok': True}
@@ -169,6 +292,9 @@ async def register_images(
 
     await save_images(images, land_id)
 
+    record_change(session, land_id)
+    session.commit()
+
     return {'msg': 'Images added successfully.', 'ok': True}
 
 @router.patch(
@@ -205,12 +331,13 @@ async def delete_land_image(
     if not image:
         raise HTTPException(status_code=404, detail=f'Image with id={image_id} not found.')
     
-    await delete_image(image.label)
+    label = image.label
 
+    record_change(session, image.land_id)
     session.delete(image)
-    session.commit()
+    job_queue.enqueue(session, 'delete_image_files', labels=[label])
 
-    return {'msg': f'Deleted image {image.label}, successfully.', 'ok': True}
+    return {'msg': f'Deleted image {label}, successfully.', 'ok': True}
 
 
 ##############
@@ -223,23 +350,10 @@ async def delete_land_image(
 async def rent_land(
 	land_id: int,
 	user: Annotated[User, Depends(authorize_user([RoleEnum.normal_user]))],
-	session: Annotated[Session, Depends(get_session)]
+	session: Annotated[Session, Depends(get_session)],
+	end_date: date = OPEN_END
 ):
-	land = session.get(Land, land_id)
-	if not land:
-		raise HTTPException(status_code=404, detail=f'Land with id={land_id} not found.')
-
-	if land.borrowed:
-		raise HTTPException(status_code=405, detail=f'Land already borrowed.')
-
-	user.lands.append(land)
-	
-	land.borrowed = True
-
-	session.add(user)
-	session.add(land)
-
-	session.commit()
+	book_land(session, land_id, user, date.today(), end_date)
 
 	session.refresh(user)
 
@@ -254,19 +368,11 @@ async def unrent_land(
 	user: Annotated[User, Depends(authorize_user([RoleEnum.normal_user]))],
 	session: Annotated[Session, Depends(get_session)]
 ):
-	land = session.exec(
-		select(Land).where(Land.id.in_(land.id for land in user.lands))
-	).first()
-	if not land:
+	rental = current_rental(session, land_id, user.id)
+	if not rental:
 		raise HTTPException(status_code=404, detail=f'User with id={user.id}, doesn\'t borrow land with id={land_id}.')
-	
-	user.lands.remove(land)
-	land.borrowed = False
-
-	session.add(user)
-	session.add(land)
 
-	session.commit()
+	end_rental(session, rental)
 
 	session.refresh(user)
 
@@ -289,20 +395,70 @@ async def unrent_land(
 	if not user:
 		raise HTTPException(status_code=404, detail=f'User with id={user_id} not found.')
 
-	land = session.exec(
-		select(Land).where(Land.id.in_(land.id for land in user.lands))
-	).first()
-	if not land:
+	rental = current_rental(session, land_id, user.id)
+	if not rental:
 		raise HTTPException(status_code=404, detail=f'User with id={user.id}, doesn\'t borrow land with id={land_id}.')
-	
-	user.lands.remove(land)
-	land.borrowed = False
 
-	session.add(user)
-	session.add(land)
-	
-	session.commit()
+	end_rental(session, rental)
 
 	session.refresh(user)
 
-	return user
\ No newline at end of file
+	return user
+
+
+##############
+## bookings
+##############
+@router.post(
+	'/{land_id}/bookings/',
+	status_code=201,
+	response_model=RentalOut
+)
+async def book_land_period(
+	land_id: int,
+	period: RentalIn,
+	user: Annotated[User, Depends(authorize_user([RoleEnum.normal_user]))],
+	session: Annotated[Session, Depends(get_session)]
+):
+	return book_land(session, land_id, user, period.start_date, period.end_date)
+
+@router.get(
+	'/{land_id}/bookings/',
+	dependencies=[Depends(authorize_user([RoleEnum.normal_user, RoleEnum.security, RoleEnum.staff]))],
+	response_model=list[RentalOut]
+)
+async def fetch_land_bookings(*,
+	land_id: int,
+	include_cancelled: bool = False,
+	skip: int = 0, limit: int = 100,
+	session: Annotated[Session, Depends(get_read_session)]
+):
+	stmt = select(Rental).where(Rental.land_id == land_id)
+	if not include_cancelled:
+		stmt = stmt.where(Rental.cancelled_at.is_(None))
+
+	return session.exec(
+		stmt.order_by(Rental.start_date.desc()).offset(skip).limit(limit)
+	).all()
+
+@router.delete(
+	'/bookings/{rental_id}',
+	response_model=RentalOut
+)
+async def cancel_booking(
+	rental_id: int,
+	user: Annotated[User, Depends(get_current_active_user)],
+	session: Annotated[Session, Depends(get_session)]
+):
+	rental = session.get(Rental, rental_id)
+	if not rental or rental.cancelled_at is not None:
+		raise HTTPException(status_code=404, detail=f'Booking with id={rental_id} not found.')
+
+	if rental.user_id != user.id and user.role != RoleEnum.admin:
+		raise HTTPException(status_code=405, detail='Not authorized.')
+
+	end_rental(session, rental)
+
+	session.refresh(rental)
+
+	return rental
@@ -0,0 +1,44 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from sqlmodel import select, Session
+from ..schemas.models import LocationStats, StatsOut
+from ..schemas.enums import RoleEnum
+from ..database import get_session
+from ..utils.security import authorize_user
+from ..utils.stats import STAT_FIELDS, recompute
+
+
+router = APIRouter(
+    prefix='/stats',
+    dependencies=[Depends(authorize_user([RoleEnum.admin]))]
+)
+
+
+@router.get(
+	'/',
+	response_model=StatsOut
+)
+async def fetch_stats(*,
+	location: str | None = None,
+	session: Annotated[Session, Depends(get_session)]
+):
+	stmt = select(LocationStats)
+	if location:
+		stmt = stmt.where(LocationStats.location == location)
+
+	locations = session.exec(stmt.order_by(LocationStats.location)).all()
+
+	totals = {field: sum(getattr(stats, field) for stats in locations) for field in STAT_FIELDS}
+
+	return StatsOut(**totals, locations=locations)
+
+@router.post(
+	'/recompute',
+	response_model=dict[str, dict]
+)
+async def recompute_stats(
+	session: Annotated[Session, Depends(get_session)]
+):
+	'''Rebuild the summaries from the land tables, returns the locations that had drifted.'''
+	return recompute(session)
@@ -1,10 +1,15 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Form, Request
 from sqlmodel import select, Session
-from ..schemas.models import User, UserIn, UserOut, UserUpdate, UserAdminUpdate, UserOutWithLands
+from sqlalchemy.orm import selectinload
+from ..schemas.models import Land, Rental, User, UserIn, UserOut, UserUpdate, UserAdminUpdate, UserOutWithLands
 from ..schemas.enums import RoleEnum
-from ..database import get_session
+from ..database import get_session, get_read_session
+from ..utils.ratelimit import register_ip_limiter, client_ip
+from ..utils.serializers import FAST_RESPONSES, FastJSONResponse, user_row_with_lands
+from ..utils.catalog import record_change
+from ..utils.rentals import release_rentals, sync_land_state
 from ..utils.security import (
 			get_password_hash,
 			get_current_active_user,
@@ -19,9 +24,12 @@ router = APIRouter(
 
 @router.post('/')
 async def register_user(
+	request: Request,
 	user: UserIn,
 	session: Annotated[Session, Depends(get_session)]
 ):
+	register_ip_limiter.check(client_ip(request))
+
 	db_user = session.exec(
 		select(User).where(User.email == user.email)
 	).first()
@@ -72,14 +80,17 @@ async def get_user(
 async def get_users(*,
 	skip: int = 0,
 	limit: int = 100,
-	session: Annotated[Session, Depends(get_session)]
+	session: Annotated[Session, Depends(get_read_session)]
 ):
 	db_users = session.exec(
-		select(User).offset(skip).limit(limit)
+		select(User).options(selectinload(User.lands).selectinload(Land.images)).offset(skip).limit(limit)
 	).all()
 
 	if not db_users:
 		raise HTTPException(status_code=404, detail='No user registered.')
+
+	if FAST_RESPONSES:
+		return FastJSONResponse([user_row_with_lands(db_user) for db_user in db_users])
 	
 	return db_users
 
@@ -101,6 +112,7 @@ async def user_update(
 	user.sqlmodel_update(update_data, update=extra)
 
 	session.add(user)
+	record_change(session, *(land.id for land in user.lands)) # renters are listed with their lands.
 	session.commit()
 
 	session.refresh(user)
@@ -127,12 +139,25 @@ async def user_update(
 	user.sqlmodel_update(update_data)
 
 	session.add(user)
+	record_change(session, *(land.id for land in user.lands)) # renters are listed with their lands.
 	session.commit()
 
 	session.refresh(user)
 
 	return user
 
+def release_user(session: Session, user: User):
+	'''Refuse (409) while the user has rentals that have not ended, drop their rental history and links.'''
+	release_rentals(session, Rental.user_id == user.id, detail=f'User with id={user.id} has rentals that have not ended, end or cancel them first.')
+
+	land_ids = [land.id for land in user.lands]
+	for land_id in land_ids: # links left by rentals that ended since the last rental sync.
+		sync_land_state(session, land_id, user.id)
+	record_change(session, *land_ids) # renters are listed with their lands.
+
+	session.flush()
+	session.expire(user, ['lands'])
+
 @router.delete(
 	'/',
 	response_model=dict[str, str | bool]
@@ -141,6 +166,7 @@ async def delete_user(
 	user: Annotated[User, Depends(get_current_active_user)],
 	session: Annotated[Session, Depends(get_session)]
 ):
+	release_user(session, user)
 	session.delete(user)
 	session.commit()
 
@@ -159,6 +185,7 @@ async def delete_user(
 	if not user:
 		raise HTTPException(status_code=404, detail='User not found.')
 
+	release_user(session, user)
 	session.delete(user)
 	session.commit()
 
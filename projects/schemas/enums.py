@@ -10,3 +10,9 @@ class RoleEnum(str, Enum):
 class IntendedUserEnum(str, Enum):
 	ONE = 'ONE'
 	ALL = 'ALL'
+
+class JobStatusEnum(str, Enum):
+	pending = 'pending'
+	running = 'running'
+	done = 'done'
+	failed = 'failed'
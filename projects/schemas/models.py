@@ -1,8 +1,9 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, Column, LargeBinary
 from fastapi import File
 from pydantic import EmailStr
-from datetime import datetime
-from .enums import RoleEnum, IntendedUserEnum
+from datetime import datetime, date
+from .enums import RoleEnum, IntendedUserEnum, JobStatusEnum
 
 ################
 ## User
@@ -93,6 +94,13 @@ class LandOutWithUser(LandOut):
 	renters: list[UserOut]
 
 
+class LandChange(SQLModel, table=True):
+	'''Change event for one land (row, images or renters), read by the land catalog (utils/catalog.py).'''
+	id: int | None = Field(default=None, primary_key=True)
+	land_id: int = Field(index=True)
+	changed_at: float = Field(index=True) # unix timestamp.
+
+
 ################
 ## Images
 ################
@@ -122,6 +130,69 @@ class ImageOut(ImageBase):
 # 	image: bytes = File()
 	
 
+################
+## Rentals
+################
+
+OPEN_END = date(9999, 12, 31) # end_date of a rental with no planned end.
+
+class RentalBase(SQLModel):
+	model_config = {'extra': 'forbid'}
+
+	start_date: date
+	end_date: date = OPEN_END # exclusive: a rental covers start_date <= day < end_date.
+
+class Rental(RentalBase, table=True):
+	# overlap checks and availability filter on (land_id, start_date, end_date).
+	__table_args__ = (Index('ix_rental_land_period', 'land_id', 'start_date', 'end_date'),)
+
+	id: int | None = Field(default=None, primary_key=True)
+	land_id: int = Field(foreign_key='land.id')
+	user_id: int = Field(foreign_key='user.id', index=True)
+	created_at: datetime = Field(default_factory=datetime.now)
+	cancelled_at: datetime | None = None
+
+class RentalIn(RentalBase):
+	pass
+
+class RentalOut(RentalBase):
+	id: int
+	land_id: int
+	user_id: int
+	created_at: datetime
+	cancelled_at: datetime | None
+
+
+################
+## Stats
+################
+
+class LocationStats(SQLModel, table=True):
+	'''Per location totals, kept up to date by the land and rental handlers (see utils/stats.py).'''
+	location: str = Field(primary_key=True)
+	lands: int = 0
+	hectares: float = 0
+	rented: int = 0
+	rented_hectares: float = 0
+	renters: int = 0
+
+class LocationStatsOut(SQLModel):
+	location: str
+	lands: int
+	hectares: float
+	rented: int
+	rented_hectares: float
+	renters: int
+
+class StatsOut(SQLModel):
+	lands: int
+	hectares: float
+	rented: int
+	rented_hectares: float
+	renters: int
+	locations: list[LocationStatsOut]
+
+
 ################
 ## Chat
 ################
@@ -137,7 +208,7 @@ class ChatBase(SQLModel):
 
 class Chat(ChatBase, table=True):
 	id: int | None = Field(default=None, primary_key=True)
-	sent_at: datetime = Field(default_factory=datetime.now)
+	sent_at: datetime = Field(default_factory=datetime.now, index=True)
 
 class ChatIn(ChatBase):
 	pass
@@ -152,10 +223,61 @@ class ChatUpdate(SQLModel):
 	intended_user: IntendedUserEnum | None = None
 	reciever_id: int | None = None
 
+#################
+## Jobs
+#################
+
+class Job(SQLModel, table=True):
+	id: int | None = Field(default=None, primary_key=True)
+	name: str = Field(index=True)
+	payload: str = '{}' # json encoded task keyword arguments.
+	status: JobStatusEnum = Field(default=JobStatusEnum.pending, index=True)
+	attempts: int = 0
+	max_attempts: int = 3
+	last_error: str | None = None
+	run_after: float = Field(default=0, index=True) # unix timestamp, used to back off retries.
+	created_at: datetime = Field(default_factory=datetime.now)
+	updated_at: datetime = Field(default_factory=datetime.now)
+	lease_until: float | None = None # unix timestamp, a running job past it is taken back.
+
+class JobOut(SQLModel):
+	id: int
+	name: str
+	status: JobStatusEnum
+	attempts: int
+	max_attempts: int
+	last_error: str | None
+	created_at: datetime
+	updated_at: datetime
+
+#################
+## Idempotency
+#################
+
+class IdempotencyRecord(SQLModel, table=True):
+	'''Response of a request sent with an Idempotency-Key header, see utils/idempotency.py.'''
+	key: str = Field(primary_key=True) # hash of the caller, method, path and header value.
+	fingerprint: str # hash of the query string and body.
+	status_code: int | None = None # None while the first request is still running.
+	content_type: str | None = None
+	body: bytes | None = Field(default=None, sa_column=Column(LargeBinary))
+	created_at: float
+	expires_at: float = Field(index=True) # lease while the request runs, then the TTL.
+
 #################
 ## Token
 #################
 
 class Token(SQLModel):
 	access_token: str
-	token_type: str
\ No newline at end of file
+	token_type: str
+	refresh_token: str | None = None
+
+class RefreshTokenIn(SQLModel):
+	model_config = {'extra': 'forbid'}
+	refresh_token: str
+
+class RevokedToken(SQLModel, table=True):
+	jti: str = Field(primary_key=True)
+	expires_at: int = Field(index=True) # unix timestamp, same as the token 'exp' claim.
+	revoked_at: float = Field(index=True)
\ No newline at end of file
@@ -0,0 +1,116 @@
+'''
+Multi-worker server (Linux/macOS, uses fork).
+
+The app is imported once in the master before forking, so workers share its pages and
+boot fast. Every worker gets DB_POOL_TOTAL // workers pooled connections, but never fewer
+than its job threads plus two (a request and a session it opens inside itself), and
+DB_WORKER_OVERFLOW more on bursts. On SIGTERM or SIGINT the master stops every worker,
+each one stops accepting and drains its in-flight requests for up to --graceful-timeout
+seconds. Crashed workers are restarted.
+
+Run from the repository root:
+    python -m projects.serve --workers 4 --port 8000
+'''
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from .utils.jobs import JOB_WORKERS
+
+DB_POOL_TOTAL = int(os.getenv('DB_POOL_TOTAL', 40))
+DB_WORKER_OVERFLOW = int(os.getenv('DB_WORKER_OVERFLOW', 4))
+
+
+def worker_pool_size(workers: int, total=DB_POOL_TOTAL) -> int:
+	# every job thread holds a connection, a request may hold two (its own and a nested one).
+	return max(JOB_WORKERS + 2, total // workers)
+
+def bind_socket(host: str, port: int) -> socket.socket:
+	sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((host, port))
+	sock.listen(2048)
+	sock.set_inheritable(True)
+	return sock
+
+def run_worker(app, sock: socket.socket, args):
+	# forget the master's handlers, uvicorn installs its own graceful ones.
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+	config = uvicorn.Config(
+		app,
+		log_level=args.log_level,
+		timeout_graceful_shutdown=args.graceful_timeout,
+		timeout_keep_alive=args.keep_alive,
+	)
+	uvicorn.Server(config).run(sockets=[sock])
+
+def spawn(app, sock, args) -> int:
+	pid = os.fork()
+	if pid == 0:
+		try:
+			run_worker(app, sock, args)
+		finally:
+			os._exit(0)
+	return pid
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Run the Land Rent API with several worker processes.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8000)
+	parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+	parser.add_argument('--graceful-timeout', type=int, default=30, help='seconds to drain in-flight requests.')
+	parser.add_argument('--keep-alive', type=int, default=5)
+	parser.add_argument('--log-level', default='info')
+	args = parser.parse_args()
+
+	os.environ.setdefault('DB_POOL_SIZE', str(worker_pool_size(args.workers)))
+	os.environ.setdefault('DB_MAX_OVERFLOW', str(DB_WORKER_OVERFLOW))
+
+	from .main import app # preload before fork.
+
+	sock = bind_socket(args.host, args.port)
+	workers = {spawn(app, sock, args) for _ in range(args.workers)}
+	print(f'Serving on {args.host}:{args.port} with {args.workers} workers, DB pool {os.environ["DB_POOL_SIZE"]} each.')
+
+	stopping = False
+
+	def stop(signum, frame):
+		nonlocal stopping
+		stopping = True
+		for pid in workers:
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+
+	while workers:
+		try:
+			pid, status = os.wait()
+		except ChildProcessError:
+			break
+		except InterruptedError:
+			continue
+
+		workers.discard(pid)
+		if not stopping:
+			print(f'Worker {pid} exited ({status}), restarting.', file=sys.stderr)
+			time.sleep(0.5) # don't spin when workers die on boot.
+			workers.add(spawn(app, sock, args))
+
+	sock.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -15,6 +15,9 @@ echo "Set ACCESS_TOKEN_KEY env"
 setx TOKEN_EXPIRE_MINUTES 45
 echo "Set TOKEN_EXPIRE_MINUTES env"
 
+setx REFRESH_TOKEN_EXPIRE_DAYS 14
+echo "Set REFRESH_TOKEN_EXPIRE_DAYS env"
+
 setx ALGORITHM "HS256"
 echo "Set ALGORITHM env"
 
@@ -28,6 +28,12 @@ if [ -n TOKEN_EXPIRE_MINUTES ]; then
     echo 'Set TOKEN_EXPIRE_MINUTES env'
 fi
 
+if [ -n REFRESH_TOKEN_EXPIRE_DAYS ]; then
+    REFRESH_TOKEN_EXPIRE_DAYS=14
+    export REFRESH_TOKEN_EXPIRE_DAYS
+    echo 'Set REFRESH_TOKEN_EXPIRE_DAYS env'
+fi
+
 if [ -n ALGORITHM ]; then
     ALGORITHM="HS256"
     export ALGORITHM
@@ -40,6 +46,14 @@ if [ -n LAND_LEND_IMAGES_DIR ]; then
     echo 'Set LAND_LEND_FILES_DIR env'
 fi
 
+if [ -n LOGIN_RATE_PER_ACCOUNT ]; then
+    # login attempts allowed per account every RATE_LIMIT_WINDOW_SECONDS.
+    # set RATE_LIMIT_REDIS_URL to share limits between workers and hosts.
+    LOGIN_RATE_PER_ACCOUNT=5
+    export LOGIN_RATE_PER_ACCOUNT
+    echo 'Set LOGIN_RATE_PER_ACCOUNT env'
+fi
+
 echo 'Done!'
 
 #echo 'If environment variables not found re-run using: source set-env.sh'
\ No newline at end of file
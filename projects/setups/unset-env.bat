@@ -6,6 +6,7 @@ setx SQLITE_URL ""
 
 setx ACCESS_TOKEN_KEY ""
 setx TOKEN_EXPIRE_MINUTES 0
+setx REFRESH_TOKEN_EXPIRE_DAYS 0
 setx ALGORITHM ""
 setx LAND_LEND_IMAGES_DIR ""
 
@@ -6,7 +6,9 @@ unset SQLITE_URL
 
 unset ACCESS_TOKEN_KEY
 unset TOKEN_EXPIRE_MINUTES
+unset REFRESH_TOKEN_EXPIRE_DAYS
 unset ALGORITHM
 unset LAND_LEND_IMAGES_DIR
+unset LOGIN_RATE_PER_ACCOUNT
 
 echo "Done!"
\ No newline at end of file
@@ -0,0 +1,211 @@
+'''
+In-memory read model of the land catalog, enabled with LAND_CATALOG=1.
+
+Each worker keeps every land with its images, renters and the periods of its rentals that
+have not ended in compact __slots__ entries, indexed by location and address, and serves
+GET /lands/, GET /lands/available and GET /lands/{id} from it. Availability is checked
+against the cached periods, so rentals ending on their own need no refresh. Write handlers
+(lands, images, rentals) call record_change() in their transaction. That adds a landchange row,
+and every worker replays the new rows at most every CATALOG_SYNC_SECONDS by reloading
+only the lands they name.
+'''
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, func, or_
+from sqlalchemy.orm import selectinload
+from ..database import get_engine
+from ..schemas.models import Land, LandChange, Rental
+from .serializers import user_row
+
+from bisect import bisect_left, insort
+from datetime import date
+import os
+import threading
+import time
+
+LAND_CATALOG = os.getenv('LAND_CATALOG', '0').lower() in ('1', 'true', 'yes')
+CATALOG_SYNC_SECONDS = float(os.getenv('CATALOG_SYNC_SECONDS', 1))
+# changes committed out of id order (postgres sequences) are caught by re-reading this window.
+CATALOG_SYNC_SLACK_SECONDS = float(os.getenv('CATALOG_SYNC_SLACK_SECONDS', 5))
+CATALOG_CHANGE_RETENTION_SECONDS = float(os.getenv('CATALOG_CHANGE_RETENTION_SECONDS', 24 * 3600))
+CATALOG_PRUNE_EVERY = int(os.getenv('CATALOG_PRUNE_EVERY', 1000)) # syncs between landchange clean ups.
+
+
+class LandEntry:
+    __slots__ = ('id', 'name', 'address', 'size', 'location', 'description', 'images', 'renters', 'periods')
+
+    def __init__(self, land: Land, periods=()):
+        self.id = land.id
+        self.name = land.name
+        self.address = land.address
+        self.size = land.size
+        self.location = land.location
+        self.description = land.description
+        self.images = tuple((image.id, image.label, image.url) for image in land.images)
+        self.renters = tuple(user_row(user) for user in land.renters)
+        self.periods = tuple(sorted(periods)) # (start_date, end_date) of live rentals.
+
+    def is_free(self, start: date, end: date) -> bool:
+        return not any(period_start < end and period_end > start for period_start, period_end in self.periods)
+
+    def row(self) -> dict:
+        '''LandOutWithUser shaped row.'''
+        return {
+            'name': self.name,
+            'address': self.address,
+            'size': self.size,
+            'location': self.location,
+            'description': self.description,
+            'id': self.id,
+            'images': [{'label': label, 'id': image_id, 'url': url} for image_id, label, url in self.images],
+            'renters': list(self.renters),
+        }
+
+
+class LandCatalog:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.ids = [] # sorted, gives the same order as the id ordered SQL query.
+        self.by_location = {}
+        self.by_address = {}
+        self.last_change_id = None
+        self.last_synced = 0.0
+        self.syncs = 0
+        self.dirty = False
+
+    def _put(self, entry: LandEntry):
+        self._remove(entry.id)
+        self.entries[entry.id] = entry
+        insort(self.ids, entry.id)
+        self.by_location.setdefault(entry.location, set()).add(entry.id)
+        self.by_address.setdefault(entry.address, set()).add(entry.id)
+
+    def _remove(self, land_id: int):
+        entry = self.entries.pop(land_id, None)
+        if entry is None:
+            return
+
+        del self.ids[bisect_left(self.ids, land_id)]
+        for index, key in ((self.by_location, entry.location), (self.by_address, entry.address)):
+            index[key].discard(land_id)
+            if not index[key]:
+                del index[key]
+
+    def _load_entries(self, session: Session, land_ids=None) -> list[LandEntry]:
+        stmt = select(Land).options(selectinload(Land.images), selectinload(Land.renters))
+        rentals = select(Rental.land_id, Rental.start_date, Rental.end_date).where(
+            Rental.cancelled_at.is_(None), Rental.end_date > date.today()
+        )
+        if land_ids is not None:
+            stmt = stmt.where(Land.id.in_(land_ids))
+            rentals = rentals.where(Rental.land_id.in_(land_ids))
+
+        periods = {}
+        for land_id, start, end in session.exec(rentals):
+            periods.setdefault(land_id, []).append((start, end))
+
+        return [LandEntry(land, periods.get(land.id, ())) for land in session.exec(stmt).all()]
+
+    def load(self, session: Session):
+        '''Full rebuild.'''
+        last_change_id = session.exec(select(func.max(LandChange.id))).first() or 0
+        entries = self._load_entries(session)
+
+        with self.lock:
+            self.entries, self.ids, self.by_location, self.by_address = {}, [], {}, {}
+            for entry in entries:
+                self._put(entry)
+            self.last_change_id = last_change_id
+
+    def refresh(self, session: Session, land_ids: set[int]):
+        '''Reload the given lands, the ones no longer in the table are dropped.'''
+        entries = self._load_entries(session, land_ids)
+
+        with self.lock:
+            for entry in entries:
+                self._put(entry)
+            for land_id in land_ids - {entry.id for entry in entries}:
+                self._remove(land_id)
+
+    def sync(self, force=False):
+        now = time.time()
+        if not force and not self.dirty and now - self.last_synced < CATALOG_SYNC_SECONDS:
+            return
+
+        with self.lock, Session(get_engine()) as session:
+            self.dirty = False
+            if self.last_change_id is None or now - self.last_synced > CATALOG_CHANGE_RETENTION_SECONDS:
+                # first use, or we slept past the pruned changes.
+                self.load(session)
+            else:
+                changes = session.exec(
+                    select(LandChange.id, LandChange.land_id).where(or_(
+                        LandChange.id > self.last_change_id,
+                        LandChange.changed_at > self.last_synced - CATALOG_SYNC_SLACK_SECONDS
+                    ))
+                ).all()
+                if changes:
+                    self.refresh(session, {land_id for _, land_id in changes})
+                    self.last_change_id = max(self.last_change_id, max(change_id for change_id, _ in changes))
+
+            self.last_synced = now
+            self.syncs += 1
+            if self.syncs % CATALOG_PRUNE_EVERY == 0:
+                session.execute(delete(LandChange).where(LandChange.changed_at < now - CATALOG_CHANGE_RETENTION_SECONDS))
+                session.commit()
+
+    def query(self, skip=0, limit=100, address=None, location=None, size_lesser=None, size_greater=None, description=None,
+              start_date=None, end_date=None) -> list[dict]:
+        '''Same filters as fetch_lands_by_filter, plus no rental in [start_date, end_date) as fetch_available_lands.'''
+        self.sync()
+
+        with self.lock:
+            candidates = None
+            for index, key in ((self.by_location, location), (self.by_address, address)):
+                if key:
+                    found = index.get(key, set())
+                    candidates = found if candidates is None else candidates & found
+
+            ids = self.ids if candidates is None else sorted(candidates)
+
+            rows = []
+            for land_id in ids:
+                entry = self.entries[land_id]
+                if description and entry.description != description:
+                    continue
+                if size_lesser and not (entry.size is not None and entry.size < size_lesser):
+                    continue
+                if size_greater and not (entry.size is not None and entry.size > size_greater):
+                    continue
+                if start_date and not entry.is_free(start_date, end_date):
+                    continue
+
+                if skip:
+                    skip -= 1
+                    continue
+                rows.append(entry.row())
+                if len(rows) >= limit:
+                    break
+
+        return rows
+
+    def get(self, land_id: int) -> dict | None:
+        self.sync()
+
+        with self.lock:
+            entry = self.entries.get(land_id)
+            return entry.row() if entry else None
+
+
+catalog = LandCatalog()
+
+
+def record_change(session: Session, *land_ids: int):
+    '''Queue catalog refreshes for these lands, committed with the caller's transaction.'''
+    if not LAND_CATALOG:
+        return
+
+    now = time.time()
+    session.add_all(LandChange(land_id=land_id, changed_at=now) for land_id in set(land_ids))
+    catalog.dirty = True
@@ -0,0 +1,208 @@
+'''
+Chat retention: move old chats out of the chat table into monthly gzip NDJSON segments.
+
+Chats older than their retention period (CHAT_RETENTION_DAYS, CHAT_BROADCAST_RETENTION_DAYS
+for intended_user=ALL) are appended to CHAT_ARCHIVE_DIR/chat-YYYY-MM.ndjson.gz, grouped by
+sent_at month, in batches of CHAT_ARCHIVE_BATCH_SIZE. Rows are deleted only after their
+batch is on disk. A crash in between means the batch is appended again on the next run,
+so readers drop repeated ids. Each batch is a separate gzip member. After a member is
+fsynced, the segment's length is recorded in a .committed file next to it: readers stop
+there, and the next append first truncates whatever a crash left past it. `compact`
+rewrites a segment as a single member without duplicates; run it on months no longer being
+archived into.
+
+Run from the repository root:
+    python -m projects.utils.chat_archive archive
+    python -m projects.utils.chat_archive compact 2024-01
+'''
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, or_, and_
+from ..database import get_engine
+from ..schemas.models import Chat
+from ..schemas.enums import IntendedUserEnum
+from .jobs import task, job_queue
+
+from datetime import datetime, timedelta
+import argparse
+import gzip
+import io
+import json
+import os
+
+CHAT_ARCHIVE_DIR = os.getenv('CHAT_ARCHIVE_DIR', os.path.join(os.environ['HOME'], 'chat_archive'))
+CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', 365))
+CHAT_BROADCAST_RETENTION_DAYS = int(os.getenv('CHAT_BROADCAST_RETENTION_DAYS', 90))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv('CHAT_ARCHIVE_BATCH_SIZE', 1000))
+CHAT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv('CHAT_ARCHIVE_INTERVAL_SECONDS', 24 * 3600)) # 0 disables it.
+
+
+def segment_path(month: str) -> str:
+    return os.path.join(CHAT_ARCHIVE_DIR, f'chat-{month}.ndjson.gz')
+
+def committed_length(path: str) -> int:
+    '''Bytes of the segment known to be complete, its whole size if it predates .committed files.'''
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    try:
+        with open(path + '.committed') as fp:
+            return min(int(fp.read()), size)
+    except (FileNotFoundError, ValueError):
+        return size
+
+def commit_length(path: str, length: int):
+    tmp_path = path + '.committed.tmp'
+    with open(tmp_path, 'w') as fp:
+        fp.write(str(length))
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path + '.committed')
+
+
+class CommittedPrefix(io.RawIOBase):
+    '''Read only the first `length` bytes of a file.'''
+
+    def __init__(self, fp, length: int):
+        self.fp = fp
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.remaining:
+            return 0
+        count = self.fp.readinto(memoryview(buffer)[:self.remaining])
+        self.remaining -= count
+        return count
+
+def expired(now: datetime | None = None):
+    '''Where clause for chats past their retention period.'''
+    now = now or datetime.now()
+    return or_(
+        and_(Chat.intended_user == IntendedUserEnum.ALL, Chat.sent_at < now - timedelta(days=CHAT_BROADCAST_RETENTION_DAYS)),
+        and_(Chat.intended_user != IntendedUserEnum.ALL, Chat.sent_at < now - timedelta(days=CHAT_RETENTION_DAYS)),
+    )
+
+def chat_record(chat: Chat) -> dict:
+    return {
+        'id': chat.id,
+        'msg': chat.msg,
+        'reciever_id': chat.reciever_id,
+        'intended_user': IntendedUserEnum(chat.intended_user).value,
+        'sender_id': chat.sender_id,
+        'sent_at': chat.sent_at.isoformat(),
+    }
+
+def write_batch(chats: list[Chat]):
+    by_month = {}
+    for chat in chats:
+        by_month.setdefault(chat.sent_at.strftime('%Y-%m'), []).append(chat_record(chat))
+
+    os.makedirs(CHAT_ARCHIVE_DIR, exist_ok=True)
+    for month, records in by_month.items():
+        path = segment_path(month)
+        length = committed_length(path)
+
+        # a new gzip member per batch, gzip readers see the concatenation as one stream.
+        with open(path, 'ab') as fp:
+            fp.truncate(length) # drop a member left half written by a crash.
+            with gzip.GzipFile(fileobj=fp, mode='wb') as gz:
+                gz.write(''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+            fp.flush()
+            os.fsync(fp.fileno())
+            length = fp.tell()
+
+        commit_length(path, length)
+
+def archive_chats(max_batches: int | None = None) -> int:
+    '''Archive expired chats batch by batch, return how many were moved.'''
+    moved = 0
+    batches = 0
+    with Session(get_engine()) as session:
+        while max_batches is None or batches < max_batches:
+            chats = session.exec(
+                select(Chat).where(expired()).order_by(Chat.id).limit(CHAT_ARCHIVE_BATCH_SIZE)
+            ).all()
+            if not chats:
+                break
+
+            write_batch(chats)
+
+            session.execute(delete(Chat).where(Chat.id.in_([chat.id for chat in chats])))
+            session.commit()
+            session.expunge_all()
+
+            moved += len(chats)
+            batches += 1
+    return moved
+
+def read_segment(month: str):
+    '''Yield the archived chats of a month, each id once.'''
+    path = segment_path(month)
+    if not os.path.exists(path):
+        return
+
+    seen = set()
+    with open(path, 'rb') as raw:
+        prefix = io.BufferedReader(CommittedPrefix(raw, committed_length(path)))
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=prefix, mode='rb'), encoding='utf-8') as fp:
+            for line in fp:
+                record = json.loads(line)
+                if record['id'] in seen:
+                    continue
+                seen.add(record['id'])
+                yield record
+
+def compact_segment(month: str) -> int:
+    '''Rewrite a segment as one gzip member without duplicates, return the record count.'''
+    path = segment_path(month)
+    tmp_path = path + '.tmp'
+
+    count = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fp:
+        for record in read_segment(month):
+            fp.write(json.dumps(record) + '\n')
+            count += 1
+    # without a .committed file the whole segment counts, so a crash in between is harmless.
+    if os.path.exists(path + '.committed'):
+        os.remove(path + '.committed')
+    os.replace(tmp_path, path)
+    commit_length(path, os.path.getsize(path))
+
+    return count
+
+
+@task('archive_chats')
+def archive_chats_task():
+    '''Job task: archive expired chats, then schedule the next run.'''
+    try:
+        moved = archive_chats()
+        if moved:
+            print(f'Archived {moved} chats.')
+    except Exception as e: # a failed run must not break the schedule.
+        print(f'Chat archive error: {e}') #
+
+    schedule_archive()
+
+def schedule_archive(delay=CHAT_ARCHIVE_INTERVAL_SECONDS):
+    if delay:
+        job_queue.schedule('archive_chats', delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive and compact old chats.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    archive = commands.add_parser('archive', help='move expired chats to the archive.')
+    archive.add_argument('--max-batches', type=int, default=None)
+    compact = commands.add_parser('compact', help='rewrite a month segment without duplicates.')
+    compact.add_argument('month', help='YYYY-MM')
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        print(f'Archived {archive_chats(args.max_batches)} chats.')
+    else:
+        print(f'Compacted {compact_segment(args.month)} chats.')
+
+
+if __name__ == '__main__':
+    main()
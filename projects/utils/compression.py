@@ -0,0 +1,79 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+import os
+
+try:
+    import brotli
+except ImportError: # brotli is optional, gzip is always available.
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv('COMPRESSION_MINIMUM_SIZE', 500))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+
+
+def accepted_encodings(headers: Headers) -> set[str]:
+    encodings = set()
+    for part in headers.get('accept-encoding', '').split(','):
+        encoding, _, params = part.partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    '''Compress responses with brotli when the client accepts it and brotli is installed, else gzip.'''
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and brotli is not None and 'br' in accepted_encodings(Headers(scope=scope)):
+            await BrotliResponder(self.app, self.minimum_size)(scope, receive, send)
+            return
+
+        await self.gzip(scope, receive, send)
+
+
+class BrotliResponder:
+    '''Buffer the response body and send it brotli compressed when it is large enough.'''
+
+    def __init__(self, app, minimum_size):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.body = []
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message['type'] == 'http.response.start':
+            self.start_message = message
+            return
+
+        if message['type'] != 'http.response.body':
+            await self.send(message)
+            return
+
+        self.body.append(message.get('body', b''))
+        if message.get('more_body', False):
+            return
+
+        body = b''.join(self.body)
+        headers = MutableHeaders(raw=list(self.start_message['headers']))
+
+        if len(body) >= self.minimum_size and 'content-encoding' not in headers:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers['Content-Encoding'] = 'br'
+            headers['Content-Length'] = str(len(body))
+            headers.add_vary_header('Accept-Encoding')
+
+        self.start_message['headers'] = headers.raw
+        await self.send(self.start_message)
+        await self.send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,273 @@
+'''
+Idempotency-Key support for retried POSTs (rent, bookings, image uploads, registration).
+
+The first request with a key claims it by inserting an idempotencyrecord row, runs, and
+stores its response. Retries with the same key get that response back, with an
+Idempotent-Replayed: true header, and the handler does not run again. Keys are per caller,
+the subject of the bearer token, so they survive a token refresh. A duplicate that
+arrives while the first one is still running waits for it, on any worker, up to
+IDEMPOTENCY_WAIT_SECONDS, and runs itself if the first one fails. Reusing a key with a
+different query string or body is rejected with 422; multipart bodies are compared part by
+part, without the client's random boundary. 5xx and 429 responses are not stored, so the
+request can be retried.
+
+A running request holds its key on a lease of IDEMPOTENCY_WAIT_SECONDS, renewed while the
+handler runs: if its worker dies, a retry takes the key over once the lease runs out.
+Stored responses expire after IDEMPOTENCY_TTL_SECONDS. Database calls run in the
+threadpool, never on the event loop.
+'''
+
+from sqlmodel import Session
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from ..database import get_engine
+from ..schemas.models import IdempotencyRecord
+from .jobs import task, job_queue
+from .token import decode_access_token
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 30))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+
+IDEMPOTENT_ROUTES = [
+    re.compile(r'^/lands/\d+/rent/?$'),
+    re.compile(r'^/lands/\d+/bookings/?$'),
+    re.compile(r'^/lands/\d+/images/?$'),
+    re.compile(r'^/users/?$'),
+]
+
+
+def caller_id(headers: Headers) -> str:
+    '''The token subject, the raw Authorization header when it is not a valid bearer token.'''
+    authorization = headers.get('authorization', '')
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        try:
+            return 'sub:' + str(decode_access_token(token).get('sub'))
+        except HTTPException:
+            pass
+    return authorization
+
+def request_key(headers: Headers, path: str, key: str) -> str:
+    # keys are per caller: two users can't read each other's responses by guessing keys.
+    return hashlib.sha256('\0'.join((caller_id(headers), 'POST', path, key)).encode()).hexdigest()
+
+def multipart_parts(body: bytes, boundary: bytes):
+    '''(normalized headers, content hash) of every part, in order.'''
+    for part in body.split(b'--' + boundary):
+        head, separator, content = part.partition(b'\r\n\r\n')
+        if not separator: # preamble and the closing '--'.
+            continue
+        headers = []
+        for line in head.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.strip():
+                headers.append(name.strip().lower() + b':' + value.strip())
+        yield b'\n'.join(sorted(headers)), hashlib.sha256(content.removesuffix(b'\r\n')).digest()
+
+def request_fingerprint(headers: Headers, query_string: bytes, body: bytes) -> str:
+    digest = hashlib.sha256(query_string + b'\0')
+    boundary = re.search(r'boundary="?([^";]+)"?', headers.get('content-type', ''))
+    if boundary:
+        # the boundary is random per request, two sends of the same form must match.
+        for part_headers, content_hash in multipart_parts(body, boundary.group(1).encode()):
+            digest.update(part_headers + b'\0' + content_hash)
+    else:
+        digest.update(body)
+    return digest.hexdigest()
+
+def claim(key: str, fingerprint: str) -> IdempotencyRecord | None:
+    '''
+    Insert the record, return None when we own the key, else the existing record.
+
+    An expired record, a stored response past its TTL or a running request past its lease,
+    is replaced.
+    '''
+    now = time.time()
+    with Session(get_engine()) as session:
+        existing = session.get(IdempotencyRecord, key)
+        if existing and existing.expires_at <= now:
+            session.delete(existing)
+            session.commit()
+            existing = None
+
+        if existing:
+            return existing
+
+        session.add(IdempotencyRecord(key=key, fingerprint=fingerprint, created_at=now, expires_at=now + IDEMPOTENCY_WAIT_SECONDS))
+        try:
+            session.commit()
+        except IntegrityError: # another worker claimed it first.
+            session.rollback()
+            return session.get(IdempotencyRecord, key)
+
+    return None
+
+def load(key: str) -> IdempotencyRecord | None:
+    with Session(get_engine()) as session:
+        return session.get(IdempotencyRecord, key)
+
+def store(key: str, status_code: int, content_type: str | None, body: bytes):
+    with Session(get_engine()) as session:
+        record = session.get(IdempotencyRecord, key)
+        if record:
+            record.status_code = status_code
+            record.content_type = content_type
+            record.body = body
+            record.expires_at = time.time() + IDEMPOTENCY_TTL_SECONDS
+            session.add(record)
+            session.commit()
+
+def renew(key: str):
+    '''Extend the lease of a request that is still running.'''
+    with Session(get_engine()) as session:
+        session.execute(
+            update(IdempotencyRecord)
+            .where(IdempotencyRecord.key == key, IdempotencyRecord.status_code.is_(None))
+            .values(expires_at=time.time() + IDEMPOTENCY_WAIT_SECONDS)
+        )
+        session.commit()
+
+def release(key: str):
+    with Session(get_engine()) as session:
+        session.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key))
+        session.commit()
+
+def replay(record: IdempotencyRecord) -> Response:
+    return Response(
+        content=record.body,
+        status_code=record.status_code,
+        media_type=record.content_type,
+        headers={'Idempotent-Replayed': 'true'}
+    )
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not any(route.match(scope['path']) for route in IDEMPOTENT_ROUTES):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get('idempotency-key')
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self.read_body(receive)
+        key = request_key(headers, scope['path'], idempotency_key)
+        fingerprint = request_fingerprint(headers, scope.get('query_string', b''), body)
+
+        record = await run_in_threadpool(claim, key, fingerprint)
+        if record is not None and record.fingerprint == fingerprint:
+            record = await self.wait_for(key, record)
+            if record is None or (record.status_code is None and record.expires_at <= time.time()):
+                # the first request failed and released the key, or its worker died and
+                # the lease ran out: run this one instead.
+                record = await run_in_threadpool(claim, key, fingerprint)
+
+        if record is not None:
+            await self.respond_duplicate(record, fingerprint, scope, receive, send)
+            return
+
+        await self.run(key, body, scope, receive, send)
+
+    async def read_body(self, receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def wait_for(self, key, record):
+        '''Poll until the running request stores its response, releases the key or loses its lease.'''
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while record is not None and record.status_code is None and record.expires_at > time.time() and time.monotonic() < deadline:
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+            record = await run_in_threadpool(load, key)
+        return record
+
+    async def respond_duplicate(self, record, fingerprint, scope, receive, send):
+        if record.fingerprint != fingerprint:
+            response = JSONResponse({'detail': 'Idempotency-Key already used for a different request.'}, status_code=422)
+        elif record.status_code is None:
+            response = JSONResponse({'detail': 'The original request is still running.'}, status_code=409, headers={'Retry-After': '1'})
+        else:
+            response = replay(record)
+        await response(scope, receive, send)
+
+    async def run(self, key, body, scope, receive, send):
+        sent = False
+
+        async def replay_body():
+            nonlocal sent
+            if sent:
+                return await receive() # body already given, only a disconnect can come now.
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                start.update(message)
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+            await send(message)
+
+        lease = asyncio.create_task(self.keep_lease(key))
+        try:
+            await self.app(scope, replay_body, capture)
+        except Exception:
+            await run_in_threadpool(release, key)
+            raise
+        finally:
+            lease.cancel()
+
+        status_code = start.get('status', 500)
+        if status_code >= 500 or status_code == 429:
+            await run_in_threadpool(release, key)
+            return
+
+        content_type = Headers(raw=start.get('headers', [])).get('content-type')
+        await run_in_threadpool(store, key, status_code, content_type, b''.join(chunks))
+
+    async def keep_lease(self, key):
+        '''Renew the lease while the handler runs, so a slow request is not run twice.'''
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_WAIT_SECONDS / 3)
+            try:
+                await run_in_threadpool(renew, key)
+            except Exception as e: # the next renewal may get through.
+                print(f'Idempotency lease renewal error: {e}') #
+
+
+@task('prune_idempotency_records')
+def prune_idempotency_records():
+    '''Job task: delete expired records, then schedule the next run.'''
+    try:
+        with Session(get_engine()) as session:
+            session.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= time.time()))
+            session.commit()
+    except Exception as e: # a failed run must not break the schedule.
+        print(f'Idempotency prune error: {e}') #
+
+    schedule_prune()
+
+def schedule_prune(delay=3600):
+    job_queue.schedule('prune_idempotency_records', delay)
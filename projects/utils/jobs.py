@@ -0,0 +1,205 @@
+from sqlmodel import Session, select
+from sqlalchemy import update, event, or_
+from ..database import get_engine
+from ..schemas.models import Job
+from ..schemas.enums import JobStatusEnum
+
+from datetime import datetime
+import json
+import os
+import threading
+import time
+import traceback
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 2))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('JOB_RETRY_BACKOFF_SECONDS', 5))
+# a running job is renewed every third of this, past it the job's process is taken for dead.
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+
+TASKS = {}
+
+
+def task(name: str):
+    '''Register a function as a job task, its keyword arguments are the job payload.'''
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+class JobQueue:
+    '''
+    In-process job queue backed by the job table.
+
+    Jobs are rows, so they survive restarts. Worker threads claim a job with a conditional
+    update, which keeps two workers (or two processes) from running the same job, and hold
+    it on a lease that a heartbeat thread renews while it runs. Jobs whose lease ran out,
+    left running by a dead process, are put back to pending; jobs other live processes
+    are running are left alone.
+    '''
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self.threads = []
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        self.running = set() # ids of the jobs this process runs, their leases get renewed.
+        self.running_lock = threading.Lock()
+
+    def enqueue(self, session: Session, name: str, max_attempts=3, run_after=0.0, commit=True, **payload) -> Job:
+        if name not in TASKS:
+            raise ValueError(f'Unknown task: {name}')
+
+        job = Job(name=name, payload=json.dumps(payload), max_attempts=max_attempts, run_after=run_after)
+        session.add(job)
+
+        if commit:
+            session.commit()
+            session.refresh(job)
+            self.wakeup.set()
+        else: # the caller commits it with its own changes.
+            event.listen(session, 'after_commit', lambda session: self.wakeup.set(), once=True)
+
+        return job
+
+    def schedule(self, name: str, delay: float, **payload) -> Job | None:
+        '''Enqueue `name` to run in `delay` seconds unless one is already pending, for periodic tasks.'''
+        with Session(get_engine()) as session:
+            pending = session.exec(
+                select(Job.id).where(Job.name == name, Job.status == JobStatusEnum.pending)
+            ).first()
+            if pending is not None:
+                return None
+
+            return self.enqueue(session, name, max_attempts=1, run_after=time.time() + delay, **payload)
+
+    def start(self):
+        if self.threads:
+            return
+
+        with Session(get_engine()) as session:
+            self.reclaim_expired(session)
+            session.commit()
+
+        self.stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        thread = threading.Thread(target=self.heartbeat, name='job-heartbeat', daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self, timeout=10):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def work(self):
+        while not self.stopping.is_set():
+            try:
+                ran = self.run_next()
+            except Exception as e: # keep the worker alive through DB hiccups.
+                print(f'Job worker error: {e}') #
+                ran = False
+
+            if not ran:
+                self.wakeup.wait(JOB_POLL_SECONDS)
+                self.wakeup.clear()
+
+    def heartbeat(self):
+        '''Renew the leases of the jobs this process runs, take back the ones of dead processes.'''
+        while not self.stopping.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                with self.running_lock:
+                    running = list(self.running)
+                with Session(get_engine()) as session:
+                    if running:
+                        session.execute(
+                            update(Job)
+                            .where(Job.id.in_(running), Job.status == JobStatusEnum.running)
+                            .values(lease_until=time.time() + JOB_LEASE_SECONDS)
+                        )
+                    self.reclaim_expired(session)
+                    session.commit()
+            except Exception as e: # the next beat may get through, leases outlast two misses.
+                print(f'Job heartbeat error: {e}') #
+
+    def reclaim_expired(self, session: Session):
+        '''Put running jobs whose lease ran out back to pending (no lease: left by an old version).'''
+        reclaimed = session.execute(
+            update(Job)
+            .where(Job.status == JobStatusEnum.running, or_(Job.lease_until.is_(None), Job.lease_until < time.time()))
+            .values(status=JobStatusEnum.pending, lease_until=None)
+        )
+        if reclaimed.rowcount:
+            self.wakeup.set()
+
+    def claim(self, session: Session) -> Job | None:
+        job = session.exec(
+            select(Job)
+            .where(Job.status == JobStatusEnum.pending, Job.run_after <= time.time())
+            .order_by(Job.id)
+            .limit(1)
+        ).first()
+        if not job:
+            return None
+
+        claimed = session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == JobStatusEnum.pending)
+            .values(
+                status=JobStatusEnum.running,
+                attempts=Job.attempts + 1,
+                lease_until=time.time() + JOB_LEASE_SECONDS,
+                updated_at=datetime.now(),
+            )
+        )
+        session.commit()
+
+        if claimed.rowcount != 1:
+            return None
+
+        session.refresh(job)
+        return job
+
+    def run_next(self) -> bool:
+        '''Run one due job, return False when there was nothing to run.'''
+        with Session(get_engine()) as session:
+            job = self.claim(session)
+        if not job:
+            return False
+
+        # no connection is held while the task runs, tasks open their own sessions.
+        with self.running_lock:
+            self.running.add(job.id)
+        try:
+            TASKS[job.name](**json.loads(job.payload))
+        except Exception:
+            job.last_error = traceback.format_exc(limit=5)
+            if job.attempts >= job.max_attempts:
+                job.status = JobStatusEnum.failed
+            else:
+                job.status = JobStatusEnum.pending
+                job.run_after = time.time() + JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        else:
+            job.status = JobStatusEnum.done
+            job.last_error = None
+        finally:
+            with self.running_lock:
+                self.running.discard(job.id)
+
+        job.lease_until = None
+        job.updated_at = datetime.now()
+        with Session(get_engine()) as session:
+            session.add(job)
+            session.commit()
+
+        return True
+
+
+job_queue = JobQueue()
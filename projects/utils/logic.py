@@ -1,7 +1,8 @@
 from sqlmodel import Session
 from fastapi import HTTPException
-from ..database import engine
+from ..database import get_engine
 from ..schemas.models import ImageIn, Image
+from .jobs import task
 
 import os
 import string
@@ -37,7 +38,7 @@ async def _save_image_db(land_id: int, update=False):
     if update:
         return
 
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         image_db = Image(label=file_name, url=url, land_id=land_id)
 
         session.add(image_db)
@@ -51,13 +52,11 @@ async def save_images(images: list[ImageIn], land_id, update=False):
         await _save_image(image)
         await _save_image_db(land_id, update=update)
 
-async def delete_image(image_label: str):
-    try:
-        file_path = os.path.join(LAND_RENT_IMAGES_DIR, image_label)
+@task('delete_image_files')
+def delete_image_files(labels: list[str]):
+    '''Job task: remove image files from disk, files already gone are skipped.'''
+    for label in labels:
         try:
-            os.remove(file_path)
-        except OSError as e:
-            print(f'Image Delete error: {e}') #
-
-    except OSError as e:
-        print('File Error', e) #
\ No newline at end of file
+            os.remove(os.path.join(LAND_RENT_IMAGES_DIR, label))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,118 @@
+from fastapi import HTTPException, Request
+
+from collections import OrderedDict
+import math
+import os
+import threading
+import time
+
+RATE_LIMIT_WINDOW_SECONDS = float(os.getenv('RATE_LIMIT_WINDOW_SECONDS', 60))
+LOGIN_RATE_PER_IP = int(os.getenv('LOGIN_RATE_PER_IP', 20))
+LOGIN_RATE_PER_ACCOUNT = int(os.getenv('LOGIN_RATE_PER_ACCOUNT', 5))
+REGISTER_RATE_PER_IP = int(os.getenv('REGISTER_RATE_PER_IP', 5))
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100_000))
+
+
+class MemoryBackend:
+    '''Per-process token buckets; least recently used keys are evicted past max_keys.'''
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key: str, capacity: int, window: float, cost: int = 1) -> float:
+        '''
+        Take `cost` tokens from the bucket, return 0 if allowed else seconds until a token
+        is free. cost=0 only checks that a token is left.
+        '''
+        rate = capacity / window
+        now = time.monotonic()
+
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= cost
+            else:
+                retry_after = (1 - tokens) / rate
+
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+
+        return retry_after
+
+
+class RedisBackend:
+    '''Token buckets shared by every worker and host, kept in redis and updated atomically.'''
+
+    SCRIPT = '''
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - cost
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate))
+    return tostring(retry_after)
+    '''
+
+    def __init__(self, url: str):
+        import redis # optional dependency, only needed for a shared backend.
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key: str, capacity: int, window: float, cost: int = 1) -> float:
+        return float(self.script(keys=['ratelimit:' + key], args=[capacity, capacity / window, time.time(), cost]))
+
+
+def get_backend():
+    if RATE_LIMIT_REDIS_URL:
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+backend = get_backend()
+
+
+class RateLimiter:
+    def __init__(self, name: str, capacity: int, window: float = RATE_LIMIT_WINDOW_SECONDS):
+        self.name = name
+        self.capacity = capacity
+        self.window = window
+
+    def check(self, key: str, cost: int = 1):
+        '''429 when the bucket is empty, else take `cost` tokens (0 to only look).'''
+        retry_after = backend.hit(f'{self.name}:{key}', self.capacity, self.window, cost)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail='Too many requests, try again later.',
+                headers={'Retry-After': str(math.ceil(retry_after))}
+            )
+
+    def charge(self, key: str):
+        '''Take a token after the fact, e.g. for a failed attempt, without raising.'''
+        backend.hit(f'{self.name}:{key}', self.capacity, self.window)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else 'unknown'
+
+
+login_ip_limiter = RateLimiter('login-ip', LOGIN_RATE_PER_IP)
+login_account_limiter = RateLimiter('login-account', LOGIN_RATE_PER_ACCOUNT)
+register_ip_limiter = RateLimiter('register-ip', REGISTER_RATE_PER_IP)
@@ -0,0 +1,156 @@
+'''
+Reconcile LAND_RENT_IMAGES_DIR with the image table.
+
+Orphans (files without an image row) are moved to a quarantine dir first and deleted once
+they have stayed there for IMAGE_QUARANTINE_SECONDS, so a file whose row shows up late is
+restored instead of lost. Image rows whose file is missing are reported.
+
+Both sides are walked in batches (os.scandir and keyset pages over image.id), so memory
+use does not depend on the number of files.
+
+Run from the repository root:
+    python -m projects.utils.reconcile            # one pass
+    python -m projects.utils.reconcile --dry-run  # report only
+    python -m projects.utils.reconcile --every 3600
+'''
+
+from sqlmodel import Session, select
+from ..database import get_engine
+from ..schemas.models import Image
+from .logic import LAND_RENT_IMAGES_DIR
+from .jobs import task, job_queue
+
+import argparse
+import os
+import time
+
+IMAGE_QUARANTINE_DIR = os.getenv('IMAGE_QUARANTINE_DIR', os.path.join(LAND_RENT_IMAGES_DIR, '.quarantine'))
+IMAGE_QUARANTINE_SECONDS = float(os.getenv('IMAGE_QUARANTINE_SECONDS', 24 * 3600))
+IMAGE_MIN_AGE_SECONDS = float(os.getenv('IMAGE_MIN_AGE_SECONDS', 3600)) # skip uploads still being registered.
+IMAGE_GC_INTERVAL_SECONDS = float(os.getenv('IMAGE_GC_INTERVAL_SECONDS', 0)) # 0 disables the scheduled job.
+RECONCILE_BATCH_SIZE = int(os.getenv('RECONCILE_BATCH_SIZE', 1000))
+
+
+def scan_files(directory: str, batch_size=RECONCILE_BATCH_SIZE, min_age=0.0):
+    '''Yield batches of (name, mtime) for regular files older than min_age.'''
+    if not os.path.isdir(directory):
+        return
+
+    cutoff = time.time() - min_age
+    batch = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+
+            mtime = entry.stat(follow_symlinks=False).st_mtime
+            if mtime > cutoff:
+                continue
+
+            batch.append((entry.name, mtime))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def known_labels(session: Session, names: list[str]) -> set[str]:
+    return set(session.exec(select(Image.label).where(Image.label.in_(names))).all())
+
+def quarantine_orphans(session: Session, dry_run=False, stats=None):
+    stats = stats if stats is not None else {}
+    for batch in scan_files(LAND_RENT_IMAGES_DIR, min_age=IMAGE_MIN_AGE_SECONDS):
+        labels = known_labels(session, [name for name, _ in batch])
+        for name, _ in batch:
+            if name in labels:
+                continue
+
+            stats['quarantined'] = stats.get('quarantined', 0) + 1
+            if dry_run:
+                print(f'orphan: {name}')
+                continue
+
+            os.makedirs(IMAGE_QUARANTINE_DIR, exist_ok=True)
+            target = os.path.join(IMAGE_QUARANTINE_DIR, name)
+            os.replace(os.path.join(LAND_RENT_IMAGES_DIR, name), target)
+            os.utime(target) # quarantine age starts now.
+    return stats
+
+def purge_quarantine(session: Session, dry_run=False, stats=None):
+    '''Delete quarantined files past the grace period, restore the ones that got a row meanwhile.'''
+    stats = stats if stats is not None else {}
+    for batch in scan_files(IMAGE_QUARANTINE_DIR):
+        labels = known_labels(session, [name for name, _ in batch])
+        expired = time.time() - IMAGE_QUARANTINE_SECONDS
+        for name, mtime in batch:
+            path = os.path.join(IMAGE_QUARANTINE_DIR, name)
+            if name in labels:
+                stats['restored'] = stats.get('restored', 0) + 1
+                if not dry_run:
+                    os.replace(path, os.path.join(LAND_RENT_IMAGES_DIR, name))
+            elif mtime <= expired:
+                stats['deleted'] = stats.get('deleted', 0) + 1
+                if not dry_run:
+                    os.remove(path)
+    return stats
+
+def missing_files(session: Session, batch_size=RECONCILE_BATCH_SIZE):
+    '''Yield (id, label) of image rows whose file is not on disk.'''
+    last_id = 0
+    while True:
+        rows = session.exec(
+            select(Image.id, Image.label).where(Image.id > last_id).order_by(Image.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+
+        for image_id, label in rows:
+            if not os.path.exists(os.path.join(LAND_RENT_IMAGES_DIR, label)):
+                yield image_id, label
+        last_id = rows[-1][0]
+
+def reconcile(dry_run=False, report_missing=True) -> dict:
+    stats = {'quarantined': 0, 'restored': 0, 'deleted': 0, 'missing': 0}
+    with Session(get_engine()) as session:
+        purge_quarantine(session, dry_run=dry_run, stats=stats)
+        quarantine_orphans(session, dry_run=dry_run, stats=stats)
+
+        if report_missing:
+            for image_id, label in missing_files(session):
+                stats['missing'] += 1
+                print(f'missing file for image id={image_id}: {label}')
+    return stats
+
+
+@task('reconcile_images')
+def reconcile_images_task():
+    '''Job task: one reconcile pass, then schedule the next one.'''
+    try:
+        print(f'Image reconcile: {reconcile(report_missing=False)}')
+    except Exception as e: # a failed pass must not break the schedule.
+        print(f'Image reconcile error: {e}') #
+
+    schedule_reconcile()
+
+def schedule_reconcile(delay=IMAGE_GC_INTERVAL_SECONDS):
+    '''Enqueue the next scheduled pass unless one is already pending.'''
+    if delay:
+        job_queue.schedule('reconcile_images', delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quarantine and delete orphaned land images.')
+    parser.add_argument('--dry-run', action='store_true', help='only report, do not move or delete files.')
+    parser.add_argument('--no-missing', action='store_true', help='skip the missing files report.')
+    parser.add_argument('--every', type=float, default=0, help='keep running, one pass every EVERY seconds.')
+    args = parser.parse_args()
+
+    while True:
+        print(reconcile(dry_run=args.dry_run, report_missing=not args.no_missing))
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+from sqlmodel import Session, select
+from sqlalchemy import exists, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+from fastapi import HTTPException
+from ..database import get_engine
+from ..schemas.models import User, Land, Rental, UserLandLink
+from .stats import apply_delta, set_borrowed
+from .catalog import record_change
+from .jobs import task, job_queue
+
+from datetime import date, datetime, timedelta
+import os
+
+# Land.borrowed and the renter links follow the ledger when rentals start and end on their own.
+RENTAL_SYNC_INTERVAL_SECONDS = float(os.getenv('RENTAL_SYNC_INTERVAL_SECONDS', 3600)) # 0 disables it.
+
+
+def overlaps(start: date, end: date):
+    '''Where clause for live rentals overlapping [start, end), on any land.'''
+    return (Rental.cancelled_at.is_(None)) & (Rental.start_date < end) & (Rental.end_date > start)
+
+def rented_today():
+    '''Where clause for live rentals covering today: the ledger's definition of "rented".'''
+    today = date.today()
+    return overlaps(today, today + timedelta(days=1))
+
+def not_ended():
+    '''Where clause for live rentals running today or later: their user is a renter of the land.'''
+    return overlaps(date.today(), date.max)
+
+def available_lands(start: date, end: date):
+    '''Lands with no live rental in [start, end), answered by the (land_id, start_date, end_date) index.'''
+    return select(Land).where(~exists().where(Rental.land_id == Land.id, overlaps(start, end)))
+
+def check_period(start: date, end: date):
+    if end <= start:
+        raise HTTPException(status_code=400, detail='end_date must be after start_date.')
+    if start < date.today():
+        raise HTTPException(status_code=400, detail='start_date is in the past.')
+
+def begin_immediate(session: Session):
+    '''Take sqlite's write lock now instead of at the first write, sqlite has no row locks.'''
+    connection = session.connection()
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def lock_land(session: Session, land_id: int) -> Land:
+    '''
+    Load the land so that two bookings for it are checked one at a time, across workers.
+
+    Postgres locks the land row (FOR UPDATE), sqlite starts the write transaction
+    (BEGIN IMMEDIATE), which also waits for every other writer. On postgres the
+    rental_no_overlap constraint (migrations/v0008) is the last line of defence.
+    '''
+    if session.get_bind().dialect.name == 'sqlite':
+        begin_immediate(session)
+
+    land = session.exec(select(Land).where(Land.id == land_id).with_for_update()).first()
+    if not land:
+        session.rollback()
+        raise HTTPException(status_code=404, detail=f'Land with id={land_id} not found.')
+    return land
+
+def book_land(session: Session, land_id: int, user: User, start: date, end: date) -> Rental:
+    check_period(start, end)
+    land = lock_land(session, land_id)
+
+    conflict = session.exec(
+        select(Rental.id).where(Rental.land_id == land.id, overlaps(start, end))
+    ).first()
+    if conflict:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=f'Land with id={land_id} is already booked in that period.')
+
+    rental = Rental(land_id=land.id, user_id=user.id, start_date=start, end_date=end)
+    session.add(rental)
+    session.flush()
+
+    sync_land_state(session, land.id, user.id)
+    record_change(session, land.id)
+    try:
+        session.commit()
+    except IntegrityError: # rental_no_overlap on postgres.
+        session.rollback()
+        raise HTTPException(status_code=409, detail=f'Land with id={land_id} is already booked in that period.')
+    session.refresh(rental)
+
+    return rental
+
+def end_rental(session: Session, rental: Rental):
+    '''Cancel a rental that has not started yet, otherwise end it today.'''
+    today = date.today()
+    if rental.start_date >= today:
+        rental.cancelled_at = datetime.now()
+    else:
+        rental.end_date = min(rental.end_date, today)
+    session.add(rental)
+    session.flush()
+
+    sync_land_state(session, rental.land_id, rental.user_id)
+    record_change(session, rental.land_id)
+    session.commit()
+
+def current_rental(session: Session, land_id: int, user_id: int) -> Rental | None:
+    return session.exec(
+        select(Rental).where(Rental.land_id == land_id, Rental.user_id == user_id, rented_today())
+    ).first()
+
+def release_rentals(session: Session, *criteria, detail: str):
+    '''
+    Before a land or user is deleted: 409 while any of its rentals has not ended, else
+    delete its past rentals (they reference it), in the caller's transaction.
+    '''
+    if session.exec(select(Rental.id).where(*criteria, not_ended())).first():
+        raise HTTPException(status_code=409, detail=detail)
+
+    session.execute(delete(Rental).where(*criteria))
+
+def sync_land_state(session: Session, land_id: int, user_id: int | None = None):
+    '''Bring Land.borrowed and, given a user, their UserLandLink in line with the ledger.'''
+    land = session.get(Land, land_id)
+    if not land:
+        return
+
+    if user_id is not None:
+        renter = session.exec(
+            select(Rental.id).where(Rental.land_id == land_id, Rental.user_id == user_id, not_ended())
+        ).first() is not None
+        link = session.get(UserLandLink, (user_id, land_id))
+        if renter and not link:
+            session.add(UserLandLink(user_id=user_id, land_id=land_id))
+            apply_delta(session, land.location, renters=1)
+        elif link and not renter:
+            session.delete(link)
+            apply_delta(session, land.location, renters=-1)
+
+    borrowed = session.exec(
+        select(Rental.id).where(Rental.land_id == land_id, rented_today())
+    ).first() is not None
+    set_borrowed(session, land, borrowed)
+    session.add(land)
+
+def sync_rental_state(session: Session) -> int:
+    '''
+    Catch up with rentals that started or ended since the last write to their land, return
+    how many lands changed. Only lands and links that disagree with the ledger are touched.
+    '''
+    rented = exists().where(Rental.land_id == Land.id, rented_today())
+    stale_lands = session.exec(
+        select(Land.id).where(or_(and_(Land.borrowed.is_(True), ~rented), and_(Land.borrowed.is_(False), rented)))
+    ).all()
+
+    renter = exists().where(Rental.land_id == UserLandLink.land_id, Rental.user_id == UserLandLink.user_id, not_ended())
+    stale_links = session.exec(select(UserLandLink.land_id, UserLandLink.user_id).where(~renter)).all()
+
+    linked = exists().where(UserLandLink.land_id == Rental.land_id, UserLandLink.user_id == Rental.user_id)
+    missing_links = session.exec(select(Rental.land_id, Rental.user_id).where(not_ended(), ~linked).distinct()).all()
+
+    for land_id, user_id in {*stale_links, *missing_links}:
+        sync_land_state(session, land_id, user_id)
+    for land_id in stale_lands:
+        sync_land_state(session, land_id)
+
+    changed = set(stale_lands) | {land_id for land_id, _ in stale_links} | {land_id for land_id, _ in missing_links}
+    record_change(session, *changed)
+    session.commit()
+
+    return len(changed)
+
+
+@task('sync_rentals')
+def sync_rentals_task():
+    '''Job task: apply rentals that started or ended, then schedule the next run.'''
+    try:
+        with Session(get_engine()) as session:
+            changed = sync_rental_state(session)
+        if changed:
+            print(f'Rental state synced for {changed} lands.')
+    except Exception as e: # a failed run must not break the schedule.
+        print(f'Rental sync error: {e}') #
+
+    schedule_rental_sync()
+
+def schedule_rental_sync(delay=RENTAL_SYNC_INTERVAL_SECONDS):
+    if delay:
+        job_queue.schedule('sync_rentals', delay)
@@ -0,0 +1,148 @@
+from sqlmodel import Session, select
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from ..database import get_engine
+from ..schemas.models import RevokedToken
+from .jobs import task, job_queue
+
+import hashlib
+import os
+import threading
+import time
+
+REVOCATION_SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', 5))
+# rows committed late (long transactions, clock skew between hosts) are caught by re-reading this window.
+REVOCATION_SYNC_SLACK_SECONDS = float(os.getenv('REVOCATION_SYNC_SLACK_SECONDS', 60))
+REVOCATION_PRUNE_INTERVAL_SECONDS = float(os.getenv('REVOCATION_PRUNE_INTERVAL_SECONDS', 3600)) # 0 disables it.
+BLOOM_FILTER_BITS = int(os.getenv('BLOOM_FILTER_BITS', 1 << 20))
+BLOOM_FILTER_HASHES = int(os.getenv('BLOOM_FILTER_HASHES', 7))
+
+
+class BloomFilter:
+    '''Set membership with no false negatives: a miss means the key was never added.'''
+
+    def __init__(self, size=BLOOM_FILTER_BITS, hashes=BLOOM_FILTER_HASHES):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationList:
+    '''
+    Revoked token ids, persisted in the revokedtoken table and mirrored in a bloom filter.
+
+    Most tokens are not revoked, so the common case is answered from memory. A filter hit
+    is confirmed against the table. Other workers' revocations are picked up every
+    REVOCATION_SYNC_SECONDS by pulling rows revoked since the previous sync, by this
+    process' clock, minus REVOCATION_SYNC_SLACK_SECONDS. Every worker also rebuilds its
+    filter from the table every REVOCATION_PRUNE_INTERVAL_SECONDS, so tokens pruned there,
+    by whichever worker ran the prune job, stop costing it false positives.
+
+    The filter lags other workers by up to a sync, so single use tokens must be spent with
+    claim(), which asks the table, not with is_revoked().
+    '''
+
+    def __init__(self):
+        self.bloom = BloomFilter()
+        self.lock = threading.Lock()
+        self.last_synced = None
+        self.rebuilt_at = None
+        self.synced_until = 0.0 # wall clock time the previous sync started.
+
+    def sync(self, session: Session, force=False):
+        now = time.monotonic()
+        if not force and self.last_synced is not None and now - self.last_synced < REVOCATION_SYNC_SECONDS:
+            return
+
+        rebuild = self.rebuilt_at is None or (
+            REVOCATION_PRUNE_INTERVAL_SECONDS and now - self.rebuilt_at >= REVOCATION_PRUNE_INTERVAL_SECONDS
+        )
+        with self.lock:
+            started = time.time()
+            query = select(RevokedToken.jti).where(RevokedToken.expires_at > int(started))
+            if rebuild:
+                bloom = BloomFilter()
+            else:
+                bloom = self.bloom
+                query = query.where(RevokedToken.revoked_at > self.synced_until - REVOCATION_SYNC_SLACK_SECONDS)
+
+            for jti in session.exec(query).all():
+                bloom.add(jti)
+
+            self.bloom = bloom
+            if rebuild:
+                self.rebuilt_at = now
+            self.synced_until = started
+            self.last_synced = now
+
+    def is_revoked(self, jti: str | None, session: Session) -> bool:
+        if jti is None:
+            return False
+
+        self.sync(session)
+        if jti not in self.bloom:
+            return False
+
+        return session.get(RevokedToken, jti) is not None
+
+    def claim(self, payload: dict, session: Session) -> bool:
+        '''Revoke the token, return False if it already was, by this or any other worker.'''
+        jti = payload.get('jti')
+        if jti is None or session.get(RevokedToken, jti):
+            return False
+
+        session.add(RevokedToken(jti=jti, expires_at=int(payload['exp']), revoked_at=time.time()))
+        try:
+            session.commit()
+        except IntegrityError: # another worker revoked it first.
+            session.rollback()
+            return False
+        finally:
+            with self.lock:
+                self.bloom.add(jti)
+
+        return True
+
+    def revoke(self, payload: dict, session: Session):
+        self.claim(payload, session)
+
+    def prune(self, session: Session):
+        '''Drop rows of tokens that have expired anyway; this worker's filter is rebuilt on next sync.'''
+        session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= int(time.time())))
+        session.commit()
+
+        with self.lock:
+            self.last_synced = None
+            self.rebuilt_at = None
+
+
+revocation_list = RevocationList()
+
+
+@task('prune_revoked_tokens')
+def prune_revoked_tokens():
+    '''Job task: drop revoked tokens that have expired anyway, then schedule the next run.'''
+    try:
+        with Session(get_engine()) as session:
+            revocation_list.prune(session)
+    except Exception as e: # a failed run must not break the schedule.
+        print(f'Revoked token prune error: {e}') #
+
+    schedule_token_prune()
+
+def schedule_token_prune(delay=REVOCATION_PRUNE_INTERVAL_SECONDS):
+    if delay:
+        job_queue.schedule('prune_revoked_tokens', delay)
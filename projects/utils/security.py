@@ -8,6 +8,7 @@ from ..database import get_session
 from ..schemas.models import User
 from ..schemas.enums import RoleEnum
 from .token import create_access_token, decode_access_token
+from .revocation import revocation_list
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
@@ -29,6 +30,9 @@ def verify_password_hash(plain_password: str, hashed_password: str) -> bool:
 
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Annotated[Session, Depends(get_session)]):
     payload = decode_access_token(token)
+    if revocation_list.is_revoked(payload.get('jti'), session):
+        raise HTTPException(status_code=401, detail='Token revoked.')
+
     email = payload.get('sub')
     db_user = session.exec(
         select(User).where(User.email == email)
@@ -0,0 +1,90 @@
+from fastapi.responses import JSONResponse
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError: # orjson is optional, fall back to the stdlib encoder.
+    orjson = None
+
+FAST_RESPONSES = os.getenv('FAST_RESPONSES', '0').lower() in ('1', 'true', 'yes')
+
+
+class FastJSONResponse(JSONResponse):
+    '''
+    Serialize plain dicts/lists built by the *_row helpers below.
+
+    Returning a Response from a route skips response_model validation, so rows must already
+    have the response model shape.
+    '''
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _default(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+def image_row(image) -> dict:
+    return {'label': image.label, 'id': image.id, 'url': image.url}
+
+def user_row(user) -> dict:
+    return {
+        'username': user.username,
+        'full_name': user.full_name,
+        'email': user.email,
+        'address': user.address,
+        'phone_number': user.phone_number,
+        'id': user.id,
+        'role': user.role,
+        'disabled': user.disabled,
+    }
+
+def land_row(land) -> dict:
+    return {
+        'name': land.name,
+        'address': land.address,
+        'size': land.size,
+        'location': land.location,
+        'description': land.description,
+        'id': land.id,
+        'images': [image_row(image) for image in land.images],
+    }
+
+def land_row_with_users(land) -> dict:
+    row = land_row(land)
+    row['renters'] = [user_row(user) for user in land.renters]
+    return row
+
+def land_row_fields(land, fields: set[str]) -> dict:
+    '''Project a land loaded with only `fields` (see routes.lands.LAND_FIELDS).'''
+    row = {}
+    for field in fields:
+        if field == 'images':
+            row[field] = [image_row(image) for image in land.images]
+        elif field == 'renters':
+            row[field] = [user_row(user) for user in land.renters]
+        else:
+            row[field] = getattr(land, field)
+    return row
+
+def user_row_with_lands(user) -> dict:
+    row = user_row(user)
+    row['lands'] = [land_row(land) for land in user.lands]
+    return row
+
+def chat_row(chat) -> dict:
+    return {
+        'msg': chat.msg,
+        'reciever_id': chat.reciever_id,
+        'intended_user': chat.intended_user,
+        'sender_id': chat.sender_id,
+        'id': chat.id,
+        'sent_at': chat.sent_at,
+    }
@@ -0,0 +1,137 @@
+from sqlmodel import Session, select
+from sqlalchemy import update, delete, func, case, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from ..database import get_engine
+from ..schemas.models import Land, Rental, LocationStats
+from .jobs import task, job_queue
+
+import os
+
+STATS_RECOMPUTE_INTERVAL_SECONDS = float(os.getenv('STATS_RECOMPUTE_INTERVAL_SECONDS', 24 * 3600)) # 0 disables it.
+
+STAT_FIELDS = ('lands', 'hectares', 'rented', 'rented_hectares', 'renters')
+
+
+def apply_delta(session: Session, location: str, **delta):
+    '''
+    Add delta to the location's counters, in the caller's transaction.
+
+    The row is created with INSERT ... ON CONFLICT DO NOTHING, so two handlers adding the
+    first land of a location don't collide, and the update is relative (col = col + delta),
+    so concurrent handlers don't overwrite each other's changes.
+    '''
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+
+    insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(session.get_bind().dialect.name)
+    if insert is not None:
+        session.execute(
+            insert(LocationStats)
+            .values(location=location, **{field: 0 for field in STAT_FIELDS})
+            .on_conflict_do_nothing(index_elements=[LocationStats.location])
+        )
+    elif session.get(LocationStats, location) is None:
+        session.add(LocationStats(location=location))
+        session.flush()
+
+    session.execute(
+        update(LocationStats)
+        .where(LocationStats.location == location)
+        .values({field: getattr(LocationStats, field) + value for field, value in delta.items()})
+        .execution_options(synchronize_session=False)
+    )
+
+def land_delta(land: Land, sign: int) -> dict:
+    '''Counters contributed by one land, negated with sign=-1.'''
+    size = land.size or 0
+    return {
+        'lands': sign,
+        'hectares': sign * size,
+        'rented': sign if land.borrowed else 0,
+        'rented_hectares': sign * size if land.borrowed else 0,
+        'renters': sign * len(land.renters),
+    }
+
+def set_borrowed(session: Session, land: Land, borrowed: bool):
+    '''Called by utils.rentals.sync_land_state with the ledger's answer: a live rental covers today.'''
+    if land.borrowed != borrowed:
+        sign = 1 if borrowed else -1
+        apply_delta(session, land.location, rented=sign, rented_hectares=sign * (land.size or 0))
+    land.borrowed = borrowed
+
+
+def compute(session: Session) -> dict[str, dict]:
+    '''
+    Full aggregation over land and the rental ledger, the reference the counters are checked
+    against. A land is rented while a live rental covers today, its renters are the users
+    with a live rental that has not ended.
+    '''
+    from .rentals import rented_today, not_ended # utils.rentals imports this module.
+
+    rented = exists().where(Rental.land_id == Land.id, rented_today())
+    renters = (
+        select(Rental.land_id, func.count(func.distinct(Rental.user_id)).label('renters'))
+        .where(not_ended())
+        .group_by(Rental.land_id)
+        .subquery()
+    )
+    rows = session.exec(
+        select(
+            Land.location,
+            func.count(Land.id),
+            func.coalesce(func.sum(Land.size), 0),
+            func.coalesce(func.sum(case((rented, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((rented, Land.size), else_=0)), 0),
+            func.coalesce(func.sum(renters.c.renters), 0),
+        )
+        .outerjoin(renters, renters.c.land_id == Land.id)
+        .group_by(Land.location)
+    ).all()
+
+    return {row[0]: dict(zip(STAT_FIELDS, row[1:])) for row in rows}
+
+def recompute(session: Session) -> dict[str, dict]:
+    '''Rebuild the summary table from scratch, return the locations that had drifted.'''
+    from .rentals import sync_rental_state
+
+    # rentals that started or ended since the last sync first: their counter updates are not
+    # drift, and the flags must agree with the rebuilt counters or the next sync skews them.
+    sync_rental_state(session)
+
+    expected = compute(session)
+    current = {
+        stats.location: {field: getattr(stats, field) for field in STAT_FIELDS}
+        for stats in session.exec(select(LocationStats)).all()
+    }
+
+    drift = {}
+    for location in expected.keys() | current.keys():
+        want = expected.get(location, dict.fromkeys(STAT_FIELDS, 0))
+        have = current.get(location, dict.fromkeys(STAT_FIELDS, 0))
+        if any(abs(want[field] - have[field]) > 1e-6 for field in STAT_FIELDS):
+            drift[location] = {'expected': want, 'found': have}
+
+    session.execute(delete(LocationStats))
+    session.add_all(LocationStats(location=location, **values) for location, values in expected.items())
+    session.commit()
+
+    return drift
+
+
+@task('recompute_stats')
+def recompute_stats_task():
+    '''Job task: verify and rebuild the summary table, then schedule the next run.'''
+    try:
+        with Session(get_engine()) as session:
+            drift = recompute(session)
+        if drift:
+            print(f'Stats drift corrected: {drift}')
+    except Exception as e: # a failed run must not break the schedule.
+        print(f'Stats recompute error: {e}') #
+
+    schedule_recompute()
+
+def schedule_recompute(delay=STATS_RECOMPUTE_INTERVAL_SECONDS):
+    if delay:
+        job_queue.schedule('recompute_stats', delay)
@@ -3,23 +3,41 @@ from jwt.exceptions import InvalidTokenError
 from fastapi import HTTPException
 from datetime import datetime, timedelta, timezone
 import os
+import uuid
 
 ACCESS_TOKEN_KEY = os.getenv('ACCESS_TOKEN_KEY', 'e9623a04fd79f49dd476f00ef4d4200209c147b83dc5db410d0d66500ef77beb')
-TOKEN_EXPIRE_MINUTES = os.getenv('EXPIRE_TIME_DELTA', 60)
+TOKEN_EXPIRE_MINUTES = int(os.getenv('EXPIRE_TIME_DELTA', 60))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', 14))
 ALGORITHM = os.getenv('ALGORITHM', 'HS256')
 
-def create_access_token(data: dict, expire_delta=timedelta(minutes=TOKEN_EXPIRE_MINUTES)):
+ACCESS_TOKEN_TYPE = 'access'
+REFRESH_TOKEN_TYPE = 'refresh'
+
+def _encode_token(data: dict, token_type: str, expire_delta: timedelta):
     to_encode = data.copy()
 
     exp = datetime.now(timezone.utc) + expire_delta
-    to_encode.update({'exp': exp})
+    to_encode.update({'exp': exp, 'jti': uuid.uuid4().hex, 'type': token_type})
 
     return jwt.encode(to_encode, ACCESS_TOKEN_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+def create_access_token(data: dict, expire_delta=timedelta(minutes=TOKEN_EXPIRE_MINUTES)):
+    return _encode_token(data, ACCESS_TOKEN_TYPE, expire_delta)
+
+def create_refresh_token(data: dict, expire_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)):
+    return _encode_token(data, REFRESH_TOKEN_TYPE, expire_delta)
+
+def decode_access_token(token: str, token_type: str = ACCESS_TOKEN_TYPE):
     try:
         payload = jwt.decode(token, key=ACCESS_TOKEN_KEY, algorithms=[ALGORITHM])
     except InvalidTokenError:
         raise HTTPException(status_code=405, detail='Token invalid or expired.')
-    
-    return payload
\ No newline at end of file
+
+    # tokens issued before refresh tokens existed carry no type and are access tokens.
+    if payload.get('type', ACCESS_TOKEN_TYPE) != token_type:
+        raise HTTPException(status_code=401, detail='Invalid token type.')
+
+    return payload
+
+def decode_refresh_token(token: str):
+    return decode_access_token(token, token_type=REFRESH_TOKEN_TYPE)